@@ -1,6 +1,72 @@
-import adal
+import os
+import json
+import time
+import threading
+import datetime
 
-def get_access_token(issuer_url, client_id, client_secret):
-    context = adal.AuthenticationContext(issuer_url)
-    token = context.acquire_token_with_client_credentials(client_id, client_id, client_secret)
-    return token['accessToken']
+class TokenCache:
+    '''
+    Access tokens saved in a file readable and writable only by the user, keyed by
+    issuer URL and client id. A token is used until "refresh_margin" seconds before
+    it expires, and then a new one is acquired, so that it doesn't expire in use.
+    '''
+
+    refresh_margin = 300
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+
+    def load(self):
+        try:
+            # Don't trust a file others could have written or read
+            if os.name == 'posix' and os.stat(self.path).st_mode & 0o077:
+                return {}
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save(self, data):
+        temp = '%s.%d.%d' % (self.path, os.getpid(), threading.current_thread().ident)
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp, self.path)
+
+    # Time when a token acquired by adal expires, in seconds since the epoch
+    def expires_at(self, token):
+        expires_on = token.get('expiresOn')
+        if expires_on:
+            # adal gives it in local time, like "2018-10-18 10:30:00.123456"
+            for format in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+                try:
+                    return time.mktime(datetime.datetime.strptime(expires_on, format).timetuple())
+                except ValueError:
+                    pass
+        return self.clock() + int(token.get('expiresIn', 0))
+
+    # Get an access token from cache, or by acquire(), which returns a token by adal.
+    def get(self, issuer_url, client_id, acquire):
+        key = '%s %s' % (issuer_url, client_id)
+        data = self.load()
+        entry = data.get(key)
+        if entry and entry['expires_at'] - self.clock() > self.refresh_margin:
+            return entry['access_token']
+        token = acquire()
+        data[key] = {
+            'access_token': token['accessToken'],
+            'expires_at': self.expires_at(token),
+        }
+        self.save(data)
+        return token['accessToken']
+
+def get_access_token(issuer_url, client_id, client_secret, cache_path=None):
+    def acquire():
+        import adal
+        context = adal.AuthenticationContext(issuer_url)
+        return context.acquire_token_with_client_credentials(client_id, client_id, client_secret)
+
+    if not cache_path:
+        return acquire()['accessToken']
+    return TokenCache(cache_path).get(issuer_url, client_id, acquire)
@@ -0,0 +1,181 @@
+import asyncio
+import atexit
+import functools
+import os
+import tempfile
+import threading
+from hpc_acm.rest import ApiException
+from hpc_acm_cli.trace import span_of
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+class Response:
+    # The minimal response object for ApiClient.deserialize
+    def __init__(self, data):
+        self.data = data
+
+class AioApi:
+    '''
+    Coroutine counterparts of some DefaultApi methods, with the same names and
+    parameters, after the args of the span of the call, to which the status and the
+    size of the response are added. They share one pooled keep-alive HTTP session. It
+    must be created in the event loop it's used in.
+    '''
+
+    def __init__(self, api_client, max_connections):
+        self.api_client = api_client
+        config = api_client.configuration
+        self.host = config.host
+        self.temp_folder_path = config.temp_folder_path
+        headers = dict(api_client.default_headers)
+        headers['Accept'] = 'application/json'
+        connector = aiohttp.TCPConnector(limit=max_connections, ssl=None if config.verify_ssl else False)
+        self.session = aiohttp.ClientSession(connector=connector, headers=headers)
+
+    @staticmethod
+    def path(template, *params):
+        return template % tuple(quote(str(p), safe='') for p in params)
+
+    @staticmethod
+    def query(**params):
+        return [(k, str(v).lower() if isinstance(v, bool) else str(v)) for k, v in params.items() if v is not None]
+
+    # Get a response of the path, with its status and size added to call, the args of the
+    # span of the call
+    async def request(self, call, path, response_type, params=None):
+        # Auth headers are got for each request, since the access token could be renewed
+        # in a long session, like that of "clus shell".
+        auth = self.api_client.configuration.auth_settings().values()
+        headers = dict((a['key'], a['value']) for a in auth)
+        async with self.session.get(self.host + path, params=params, headers=headers) as resp:
+            call['status'] = resp.status
+            call['bytes'] = resp.content_length
+            if not 200 <= resp.status <= 299:
+                e = ApiException(status=resp.status, reason=resp.reason)
+                e.body = await resp.text()
+                raise e
+            if response_type == 'file':
+                return await self.save(resp)
+            data = await resp.text()
+        return self.api_client.deserialize(Response(data), response_type)
+
+    # Save response body into a temp file, like ApiClient does for a file response
+    async def save(self, resp):
+        fd, path = tempfile.mkstemp(dir=self.temp_folder_path)
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                f.write(chunk)
+        return path
+
+    async def close(self):
+        await self.session.close()
+
+    async def get_clusrun_task_result(self, call, id, task_id):
+        return await self.request(call, self.path('/clusrun/%s/tasks/%s/result', id, task_id), 'TaskResult')
+
+    async def get_clusrun_output_in_page(self, call, key, offset=None, page_size=None):
+        params = self.query(offset=offset, pageSize=page_size)
+        return await self.request(call, self.path('/output/clusrun/%s/page', key), 'TaskOutput', params)
+
+    async def get_clusrun_output(self, call, key):
+        return await self.request(call, self.path('/output/clusrun/%s/raw', key), 'file')
+
+class AioScheduler:
+    '''
+    Scheduler of calls started by AsyncOp.call, like async_op.Scheduler, but running
+    the calls as coroutines in a single event loop thread, rather than in a thread
+    each. A call to a DefaultApi method with a counterpart in AioApi is made by the
+    shared HTTP session, and others are run in the default executor of the loop.
+    '''
+
+    def __init__(self, api, max_in_flight, endpoint_limits=None):
+        if aiohttp is None:
+            raise ImportError('The asyncio engine requires the "aiohttp" package. Install it by "pip install hpc-acm-cli[asyncio]".')
+        self.api = api
+        self.max_in_flight = max_in_flight
+        self.endpoint_limits = endpoint_limits or {}
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def submit(self, call, func, args, kwargs):
+        if self.loop is None:
+            with self.lock:
+                if self.loop is None:
+                    self.start()
+        asyncio.run_coroutine_threadsafe(self.run(call, func, args, kwargs), self.loop)
+
+    def submit_later(self, delay, call, func, args, kwargs):
+        if delay <= 0:
+            self.submit(call, func, args, kwargs)
+            return
+        if self.loop is None:
+            with self.lock:
+                if self.loop is None:
+                    self.start()
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, self.start_run, call, func, args, kwargs)
+
+    # Start a call in the loop thread
+    def start_run(self, call, func, args, kwargs):
+        self.loop.create_task(self.run(call, func, args, kwargs))
+
+    def start(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.run_loop, args=(loop,))
+        thread.daemon = True
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self.setup(), loop).result()
+        self.loop = loop
+        atexit.register(self.close)
+
+    @staticmethod
+    def run_loop(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    async def setup(self):
+        self.aio_api = AioApi(self.api.api_client, self.max_in_flight)
+        # Semaphores wake up waiters in FIFO order.
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.endpoint_semaphores = dict((k, asyncio.Semaphore(v)) for k, v in self.endpoint_limits.items())
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.aio_api.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def run(self, call, func, args, kwargs):
+        endpoint = func.__name__
+        # Wait for the endpoint first, so that a call for an endpoint at its limit
+        # doesn't take a slot from calls for other endpoints.
+        endpoint_semaphore = self.endpoint_semaphores.get(endpoint)
+        if endpoint_semaphore:
+            await endpoint_semaphore.acquire()
+        try:
+            async with self.semaphore:
+                coroutine = getattr(self.aio_api, endpoint, None)
+                try:
+                    if coroutine:
+                        # In a span by the tracer of the command making the call, if any,
+                        # since commands can share the loop
+                        with span_of(getattr(func, 'tracer', None), 'api', endpoint) as call_args:
+                            value = await coroutine(call_args, *args, **kwargs)
+                    else:
+                        value = await self.loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+        finally:
+            if endpoint_semaphore:
+                endpoint_semaphore.release()
+        if error is None:
+            call.set(value)
+        else:
+            call.set(error=error)
@@ -1,24 +1,241 @@
-from tqdm import tqdm
 import time
-import platform
+import heapq
+import threading
+from itertools import count
+from collections import deque
+from hpc_acm_cli.trace import span, bind
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class AsyncCall:
+    '''
+    Result of a call started by AsyncOp.call. It has the same ready/get interface as
+    the thread returned by a swagger API called with "async", but signals its op when
+    the call is over, so that the op is advanced only when there is something to do.
+    '''
+
+    def __init__(self, op):
+        self.op = op
+        self.done = False
+        self.value = None
+        self.error = None
+
+    def run(self, func, args, kwargs):
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            self.set(error=e)
+        else:
+            self.set(value)
+
+    def set(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self.done = True
+        self.op.signal()
+
+    def ready(self):
+        return self.done
+
+    def get(self):
+        if not self.done:
+            raise AsyncOp.NotReady()
+        if self.error is not None:
+            raise self.error
+        return self.value
 
 class AsyncOp:
     class NotReady(Exception):
         pass
 
+    # The completion queue of async_wait, into which the op puts itself when signaled
+    completion_queue = None
+
+    # Whether the op has been signaled, maybe before it's waited by async_wait
+    signaled = False
+
     def get_result(self):
         pass
 
-# ops is a list of AsyncOp object
-def async_wait(ops, handler=None, desc=None):
+    # Call func asynchronously, like a swagger API called with "async". The call is
+    # admitted by the scheduler of the op, i.e., its "scheduler" attribute, and traced
+    # by the tracer of the command making it.
+    def call(self, func, *args, **kwargs):
+        call = AsyncCall(self)
+        self.scheduler.submit(call, bind(func), args, kwargs)
+        return call
+
+    # Call func like call, but after delay seconds, as for polling a server again
+    def call_later(self, delay, func, *args, **kwargs):
+        call = AsyncCall(self)
+        self.scheduler.submit_later(delay, call, bind(func), args, kwargs)
+        return call
+
+    def signal(self):
+        # NOTE: The flag is set before the queue is checked, and the queue is set before
+        # the flag is checked in attach, so that a signal is never lost, though it may
+        # be delivered twice, which is harmless.
+        self.signaled = True
+        if self.completion_queue is not None:
+            self.completion_queue.put(self)
+
+    def attach(self, completion_queue):
+        self.completion_queue = completion_queue
+        if self.signaled:
+            completion_queue.put(self)
+
+class ReadyOp(AsyncOp):
+    # An op whose result is known already, for ops mixed with those waiting for calls
+    def __init__(self, result):
+        self.result = result
+
+    def get_result(self):
+        return self.result
+
+class Scheduler:
+    '''
+    Scheduler of calls started by AsyncOp.call, so that the API server is not flooded
+    by thousands of concurrent requests. At most max_in_flight calls are in flight, and
+    at most endpoint_limits[name] of them are for the API of the name. Calls are
+    admitted in FIFO order, except that a call for an endpoint at its limit doesn't
+    block those for other endpoints behind it. Calls submitted with a delay are held
+    by a timer thread, without taking a slot, until they're due.
+    '''
+
+    def __init__(self, max_in_flight, endpoint_limits=None):
+        self.max_in_flight = max_in_flight
+        self.endpoint_limits = endpoint_limits or {}
+        self.in_flight = 0
+        self.endpoint_in_flight = {}
+        # A FIFO of waiting calls for each endpoint. A waiting call is a tuple of
+        # (sequence number, AsyncCall, func, args, kwargs).
+        self.waiting = {}
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.pool = None
+        # A heap of delayed calls, each a tuple of (due time, sequence number, AsyncCall,
+        # func, args, kwargs), and the timer thread submitting them when due
+        self.timers = []
+        self.timer_sequence = count()
+        self.timer_condition = threading.Condition(threading.Lock())
+        self.timer_thread = None
+
+    def submit_later(self, delay, call, func, args, kwargs):
+        if delay <= 0:
+            self.submit(call, func, args, kwargs)
+            return
+        with self.timer_condition:
+            heapq.heappush(self.timers, (time.time() + delay, next(self.timer_sequence), call, func, args, kwargs))
+            if self.timer_thread is None:
+                self.timer_thread = threading.Thread(target=self.run_timers, name='Scheduler timer')
+                self.timer_thread.daemon = True
+                self.timer_thread.start()
+            self.timer_condition.notify()
+
+    def run_timers(self):
+        while True:
+            with self.timer_condition:
+                now = time.time()
+                while not self.timers or self.timers[0][0] > now:
+                    self.timer_condition.wait(self.timers[0][0] - now if self.timers else None)
+                    now = time.time()
+                due = []
+                while self.timers and self.timers[0][0] <= now:
+                    due.append(heapq.heappop(self.timers)[2:])
+            for call, func, args, kwargs in due:
+                self.submit(call, func, args, kwargs)
+
+    def submit(self, call, func, args, kwargs):
+        endpoint = func.__name__
+        with self.lock:
+            self.sequence += 1
+            self.waiting.setdefault(endpoint, deque()).append((self.sequence, call, func, args, kwargs))
+            admitted = self.admit()
+        self.start(admitted)
+
+    # Take the admitted calls out of the waiting ones. It must be called with the lock held.
+    def admit(self):
+        admitted = []
+        while self.in_flight < self.max_in_flight:
+            first = None
+            for endpoint, calls in self.waiting.items():
+                if not calls or self.endpoint_in_flight.get(endpoint, 0) >= self.endpoint_limits.get(endpoint, self.max_in_flight):
+                    continue
+                if first is None or calls[0][0] < self.waiting[first][0][0]:
+                    first = endpoint
+            if first is None:
+                break
+            admitted.append((first,) + self.waiting[first].popleft()[1:])
+            self.in_flight += 1
+            self.endpoint_in_flight[first] = self.endpoint_in_flight.get(first, 0) + 1
+        return admitted
+
+    def start(self, admitted):
+        if not admitted:
+            return
+        if self.pool is None:
+            from multiprocessing.pool import ThreadPool
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ThreadPool(self.max_in_flight)
+        for e in admitted:
+            self.pool.apply_async(self.run, e)
+
+    def run(self, endpoint, call, func, args, kwargs):
+        try:
+            call.run(func, args, kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.endpoint_in_flight[endpoint] -= 1
+                admitted = self.admit()
+            self.start(admitted)
+
+# Interval in seconds to check all the pending ops when none is signaled. It's a safety
+# net for ops that don't signal, i.e., those not using AsyncOp.call.
+sweep_interval = 1
+
+# ops is a list of AsyncOp object. Waiting stops when "quorum" of them are done, or after
+# "timeout" seconds, if given, rather than when all are done, and results of those not
+# done are None. Ops done by the timeout are taken, even if they're not signaled yet.
+def async_wait(ops, handler=None, desc=None, quorum=None, timeout=None):
+    with span('phase', desc or 'Waiting', ops=len(ops)):
+        return wait_ops(ops, handler, desc, quorum, timeout)
+
+def wait_ops(ops, handler, desc, quorum=None, timeout=None):
+    import platform
+    from tqdm import tqdm
     total = len(ops)
     done = [False for i in range(total)]
     done_count = 0
     prog = tqdm(total=total, desc=desc, ascii=(platform.system() == 'Windows'))
     results = [None for i in range(total)] if not handler else []
-    while done_count != total:
-        yielded = False
-        for idx, op in enumerate(ops):
+    indexes = {}
+    completion_queue = queue.Queue()
+    for idx, op in enumerate(ops):
+        indexes[id(op)] = idx
+        op.attach(completion_queue)
+    target = total if quorum is None else min(quorum, total)
+    deadline = time.time() + timeout if timeout is not None else None
+    while done_count < target:
+        wait = sweep_interval
+        last = False
+        if deadline is not None:
+            wait = min(wait, deadline - time.time())
+            last = wait <= 0
+        if last:
+            # Take all ops done by now, without waiting, for the last time
+            ready_ops = [op for idx, op in enumerate(ops) if not done[idx]]
+        else:
+            try:
+                ready_ops = [completion_queue.get(timeout=wait)]
+            except queue.Empty:
+                ready_ops = [op for idx, op in enumerate(ops) if not done[idx]]
+        for op in ready_ops:
+            idx = indexes[id(op)]
             if done[idx]:
                 continue
             try:
@@ -26,7 +243,6 @@ def async_wait(ops, handler=None, desc=None):
             except AsyncOp.NotReady:
                 pass
             else:
-                yielded = True
                 done[idx] = True
                 done_count += 1
                 if handler:
@@ -34,8 +250,37 @@ def async_wait(ops, handler=None, desc=None):
                 else:
                     results[idx] = result
                 prog.update(1)
-        if not yielded:
-            time.sleep(0.1)
+        if last:
+            break
     prog.close()
     return results
 
+
+# Yield results of ops, an iterable of AsyncOp objects, in their order as they're ready.
+# Ops are taken from the iterable up to "window" ahead of the one whose result is to be
+# yielded, so that later ops are in progress while earlier results are used, and the
+# ops pending are bounded.
+def async_iter(ops, window):
+    ops = iter(ops)
+    pending = deque()
+    completion_queue = queue.Queue()
+    while True:
+        for op in ops:
+            op.attach(completion_queue)
+            pending.append(op)
+            if len(pending) >= window:
+                break
+        if not pending:
+            return
+        while True:
+            try:
+                result = pending[0].get_result()
+            except AsyncOp.NotReady:
+                try:
+                    completion_queue.get(timeout=sweep_interval)
+                except queue.Empty:
+                    pass
+            else:
+                break
+        pending.popleft()
+        yield result
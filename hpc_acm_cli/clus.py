@@ -1,14 +1,44 @@
 from __future__ import print_function
+import os
+import re
+import math
 import time
+import hashlib
+import argparse
+import functools
 import datetime
 import sys
-from tqdm import tqdm
-from hpc_acm.rest import ApiException
+from itertools import chain
 from hpc_acm_cli.command import Command
-from hpc_acm_cli.utils import print_table, match_names, shorten, arrange
-from hpc_acm_cli.async_op import async_wait, AsyncOp
+from hpc_acm_cli.utils import shorten, arrange, arrange_nodes, iter_pages
+from hpc_acm_cli.async_op import async_wait, async_iter, AsyncOp, ReadyOp
+from hpc_acm_cli.trace import span
+from hpc_acm_cli.polling import Poller, PollTimeout
+from hpc_acm_cli.progress import Progress
+from hpc_acm_cli.hostlist import compress_hostlist
+
+# Parse the "--wait-for" parameter, a number like "90", or a percentage like "90%", to a
+# tuple of the number and whether it's a percentage
+def quorum_value(value):
+    m = re.match(r'^(\d+(?:\.\d+)?)(%?)$', value.strip())
+    if not m or (not m.group(2) and '.' in m.group(1)) or (m.group(2) and float(m.group(1)) > 100):
+        raise argparse.ArgumentTypeError('invalid number or percentage "%s"' % value)
+    return (float(m.group(1)), bool(m.group(2)))
 
 class Clusrun(Command):
+    # Tasks not over by "--task-timeout" or "--wait-for" are stragglers when they've taken
+    # more than this times the median time of those over
+    straggler_factor = 2
+
+    # Seconds to wait for output of tasks that are over when waiting for them stops
+    output_grace = 10
+
+    # The time to start waiting for tasks at, the time by "--task-timeout" to stop waiting
+    # at, or None to wait forever, and the "--wait-for" parameter while the job is not over
+    wait_start = None
+    deadline = None
+    wait_for = None
+
     @classmethod
     def profile(cls):
         return {
@@ -43,7 +73,7 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                         'name': '--asc',
                         'options': { 'help': 'query in id-ascending order', 'action': 'store_true' }
                     },
-                ],
+                ] + cls.paging_params(config) + cls.job_filter_params(config),
             },
             {
                 'name': 'show',
@@ -62,7 +92,39 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                             'action': 'store_true'
                         }
                     },
-                ],
+                    {
+                        'group': True,
+                        'items': [
+                            {
+                                'name': '--stream',
+                                'options': {
+                                    'help': 'show task output as it comes, with each line prefixed by the node name',
+                                    'action': 'store_true'
+                                }
+                            },
+                            {
+                                'name': '--collapse',
+                                'options': {
+                                    'help': 'show each distinct output, with exit code, once for all nodes of it',
+                                    'action': 'store_true'
+                                }
+                            },
+                            {
+                                'name': '--save-dir',
+                                'options': {
+                                    'help': 'save task output to files named "<job id>/<node>.log" in the directory, rather than show it. Files partly saved by a previous run for the job are resumed, and those saved in whole are skipped.',
+                                }
+                            },
+                        ]
+                    },
+                    {
+                        'name': '--poll-timeout',
+                        'options': {
+                            'help': 'seconds to wait for the job state before giving up. By default, it waits forever.',
+                            'type': float,
+                        }
+                    },
+                ] + cls.wait_params(config) + cls.progress_params(config) + cls.job_cache_params(config),
             },
             {
                 'name': 'new',
@@ -76,13 +138,13 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                             {
                                 'name': '--nodes',
                                 'options': {
-                                    'help': 'names of nodes. Multiple names are separated by spaces and quoted as one string, like "node1 node2 node3". Either this or the --pattern parameter must be provided.',
+                                    'help': 'names of nodes. Multiple names are separated by spaces or commas and quoted as one string, like "node1 node2 node3", and numbered names can be in ranges, like "node[001-100,200]". Either this or the --pattern parameter must be provided.',
                                 }
                             },
                             {
                                 'name': '--pattern',
                                 'options': {
-                                    'help': 'name pattern of nodes. Either this or the --nodes parameter must be provided.',
+                                    'help': 'name patterns of nodes, separated by spaces and quoted as one string, like "node* !node0*". Those starting with "!" exclude nodes. Either this or the --nodes parameter must be provided.',
                                     'default': config.get('DEFAULT', 'pattern', fallback=None)
                                 }
                             },
@@ -99,42 +161,95 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                             'action': 'store_true'
                         }
                     },
-                ],
+                    {
+                        'group': True,
+                        'items': [
+                            {
+                                'name': '--stream',
+                                'options': {
+                                    'help': 'show task output as it comes, with each line prefixed by the node name',
+                                    'action': 'store_true'
+                                }
+                            },
+                            {
+                                'name': '--collapse',
+                                'options': {
+                                    'help': 'show each distinct output, with exit code, once for all nodes of it',
+                                    'action': 'store_true'
+                                }
+                            },
+                            {
+                                'name': '--save-dir',
+                                'options': {
+                                    'help': 'save task output to files named "<job id>/<node>.log" in the directory, rather than show it. Files partly saved by a previous run for the job are resumed, and those saved in whole are skipped.',
+                                }
+                            },
+                        ]
+                    },
+                    {
+                        'name': '--poll-timeout',
+                        'options': {
+                            'help': 'seconds to wait for the job state before giving up. By default, it waits forever.',
+                            'type': float,
+                        }
+                    },
+                ] + cls.wait_params(config) + cls.progress_params(config) + cls.node_cache_params(config),
             },
             {
                 'name': 'cancel',
                 'options': {
-                    'help': 'cancel a job',
+                    'help': 'cancel jobs',
                 },
-                'params': [
-                    {
-                        'name': 'ids',
-                        'options': { 'help': 'job id', 'metavar': 'id', 'nargs': '+' }
-                    },
-                ],
+                'params': cls.cancel_params(config),
+            },
+        ]
+
+    # Parameters of a "show" or "new" subcommand for when to stop waiting for tasks
+    @classmethod
+    def wait_params(cls, config):
+        return [
+            {
+                'name': '--task-timeout',
+                'options': {
+                    'help': 'seconds to wait for tasks, and their output, to be over, from when the command starts to wait for them. Tasks not over then are reported, and it exits with an error. By default, it waits forever.',
+                    'type': float,
+                }
+            },
+            {
+                'name': '--wait-for',
+                'options': {
+                    'help': 'number of tasks, or percentage of them like "90%%", to wait for to be over, rather than all. Tasks not over then are reported, and their output can be shown by a "show" subcommand later.',
+                    'type': quorum_value,
+                    'metavar': 'N|PCT',
+                }
+            },
+            {
+                'name': '--cancel-stragglers',
+                'options': {
+                    'help': 'cancel the job, and so its tasks not over, when it stops waiting by the --task-timeout or --wait-for parameter',
+                    'action': 'store_true'
+                }
             },
         ]
 
     def list(self):
-        jobs = self.api.get_clusrun_jobs(reverse=not self.args.asc, count=self.args.count, last_id=self.args.last_id)
-        self.print_jobs(jobs)
+        conditions, over = self.job_filters()
+        jobs = self.list_objects(self.api.get_clusrun_jobs, conditions, over, reverse=not self.args.asc)
+        if self.args.output == 'jsonl':
+            self.print_json_lines(jobs)
+        else:
+            self.print_jobs(jobs)
 
     def show(self):
-        job = self.api.get_clusrun_job(self.args.id)
+        id = self.args.id
+        job = self.get_cached('clusrun-job', id, 'Job', lambda: self.api.get_clusrun_job(id), self.is_over)
         if self.args.short:
             self.show_in_short(job)
         else:
             self.show_progressing(job)
 
     def new(self):
-        if self.args.nodes:
-            nodes = self.args.nodes.split()
-        elif self.args.pattern:
-            all = self.api.get_nodes(count=1000000)
-            names = [n.name for n in all]
-            nodes = match_names(names, self.args.pattern)
-        else:
-            raise ValueError('Either nodes or pattern parameter must be provided!')
+        nodes = self.target_nodes()
 
         job = {
             "name": "Command@%s" % datetime.datetime.now().isoformat(),
@@ -148,23 +263,19 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
             self.show_progressing(job)
 
     def cancel(self):
-        for id in self.args.ids:
-            try:
-                self.api.cancel_clusrun_job(id, job = { "request": "cancel" })
-                print("Job %s is canceled." % id)
-            except ApiException as e:
-                print("Failed to cancel job %s. Error:\n" % id, e)
+        # For "--match", a job is matched by its command line
+        self.cancel_jobs(self.api.get_clusrun_jobs, self.api.cancel_clusrun_job, lambda j: j.command_line)
 
     def print_jobs(self, jobs, in_short=True):
         target_nodes = {
             'title': 'Target nodes',
-            'value': lambda j: len(j.target_nodes)
+            'value': lambda j: len(j.target_nodes) if in_short else arrange_nodes(j.target_nodes, 40)
         }
         command = {
             'title': 'Command',
             'value': lambda j: shorten(j.command_line, 60) if in_short else arrange(j.command_line, 60)
         }
-        print_table(['id', command, 'state', target_nodes, 'created_at'], jobs)
+        self.print_table(['id', command, 'state', target_nodes, 'created_at'], jobs)
 
     def show_in_short(self, job):
         self.print_jobs([job], in_short=False)
@@ -172,8 +283,85 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
 
     def show_progressing(self, job):
         self.print_jobs([job])
+        self.wait_start = time.time()
+        self.deadline = self.wait_start + self.args.task_timeout if self.args.task_timeout is not None else None
+        self.wait_for = self.args.wait_for
+        quorum = self.quorum(len(job.target_nodes))
+
+        def enough(counts):
+            over = sum(counts.get(s, 0) for s in Progress.end_states)
+            return (quorum is not None and over >= quorum) or self.timed_out()
+
+        job = self.watch_progress(job, self.api.get_clusrun_job, self.api.get_clusrun_tasks, until=enough)
+        if self.is_over(job):
+            # Output of all tasks is there to get
+            self.deadline = self.wait_for = None
         self.show_task_outputs(job)
 
+    # Number of tasks of total to wait for by the "--wait-for" parameter, or None for all
+    def quorum(self, total):
+        if self.wait_for is None:
+            return None
+        number, percent = self.wait_for
+        if percent:
+            return min(int(math.ceil(total * number / 100.0)), total)
+        return min(int(number), total)
+
+    def timed_out(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    # Wait for ops of output of tasks, like GetTaskOutput, by async_wait with handler, until
+    # all are done, or those of tasks by "--wait-for" are, counting "done" tasks over
+    # already, or until the time by "--task-timeout". Output of tasks that were over when
+    # they were got is waited for up to "output_grace" seconds more. Tasks not over then,
+    # and those whose output is not got by the grace, are reported.
+    def wait_task_outputs(self, ops, handler, desc, done=0):
+        quorum = self.quorum(len(ops) + done)
+        start = self.wait_start or time.time()
+        # Seconds for each op to be done since the start, by index. Tasks have no time
+        # of start or end, so it's by when their output is got.
+        durations = {}
+
+        def on_result(idx, result, end=None):
+            end = min(end or time.time(), self.over_at.get(ops[idx].task.id, float('inf')))
+            durations[idx] = end - start
+            handler(idx, result)
+
+        timeout = max(self.deadline - time.time(), 0) if self.deadline is not None else None
+        async_wait(ops, on_result, desc=desc, quorum=None if quorum is None else max(quorum - done, 0), timeout=timeout)
+        stop = time.time()
+        over = [idx for idx, op in enumerate(ops) if idx not in durations and (
+            op.task.id in self.over_at or op.task.state in Progress.end_states)]
+        if over:
+            # They're over by when waiting stopped, though their output is got later
+            async_wait([ops[idx] for idx in over], lambda i, result: on_result(over[i], result, stop),
+                desc=desc, timeout=self.output_grace)
+        unloaded = [ops[idx].task for idx in over if idx not in durations]
+        if unloaded:
+            print('Output of %d tasks over is not got in %s seconds more: %s' % (
+                len(unloaded), self.output_grace, compress_hostlist([t.node for t in unloaded])), file=sys.stderr)
+        rest = [op.task for idx, op in enumerate(ops) if idx not in durations and idx not in over]
+        if rest:
+            self.report_stragglers(rest, sorted(durations.values()), time.time() - start)
+        if (rest or unloaded) and (quorum is None or len(durations) + done < quorum):
+            raise PollTimeout('%d tasks are not over, or without output, in %s seconds!' % (
+                len(rest) + len(unloaded), self.args.task_timeout))
+
+    def report_stragglers(self, tasks, durations, elapsed):
+        median = durations[len(durations) // 2] if durations else None
+        nodes = compress_hostlist([t.node for t in tasks])
+        if median is not None and elapsed > median * self.straggler_factor:
+            print('%d stragglers, not over in %.1f seconds, over %s times the median %.1f seconds of other tasks: %s' % (
+                len(tasks), elapsed, self.straggler_factor, median, nodes), file=sys.stderr)
+        else:
+            print('%d tasks not over in %.1f seconds: %s' % (len(tasks), elapsed, nodes), file=sys.stderr)
+        job_id = tasks[0].job_id
+        if self.args.cancel_stragglers:
+            self.api.cancel_clusrun_job(job_id, job={ "request": "cancel" })
+            print('Job %s is canceled.' % job_id, file=sys.stderr)
+        else:
+            print('Run "clusrun show %s" for output of them later.' % job_id, file=sys.stderr)
+
     def list_tasks(self, job):
         def task_info(task, result):
             return {
@@ -183,41 +371,103 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                 'result_url': '%s/output/clusrun/%s/raw' % (self.args.host, result.result_key) if result else ''
             }
 
-        tasks = self.api.get_clusrun_tasks(job.id, count=len(job.target_nodes))
-        if not tasks:
+        tasks = self.iter_tasks(job, cache=self.is_over(job))
+        rows = (task_info(t, r) for t, r in self.iter_task_results(tasks))
+        first = next(rows, None)
+        if first is None:
             print("No tasks created yet!")
             return
-
-        task_results = self.wait_task_results(tasks)
-        results = [task_info(t[0], t[1]) for t in zip(tasks, task_results)]
-        print_table(['id', 'node', 'state', 'result_url'], results)
+        self.print_table(['id', 'node', 'state', 'result_url'], chain([first], rows))
 
     class GetTaskResult(AsyncOp):
-        def __init__(self, api, task):
+        def __init__(self, api, scheduler, task):
             self.api = api
-            self.async_task_result = self.api.get_clusrun_task_result(task.job_id, task.id, async=True)
+            self.scheduler = scheduler
+            self.task = task
+            self.async_task_result = self.call(self.api.get_clusrun_task_result, task.job_id, task.id)
             self.task_result = None
             self.ready = False
 
         def get_result(self):
             if self.ready:
-                return self.task_result
+                return (self.task, self.task_result)
             if not self.async_task_result.ready():
                 raise AsyncOp.NotReady()
             self.ready = True
             try:
                 self.task_result = self.async_task_result.get()
-            except ApiException: # 404
+            except Command.ApiException: # 404
                 self.task_result = None
-            return self.task_result
+            return (self.task, self.task_result)
+
+    # Tasks of a job, page by page. With cache, i.e., when the job is over, they're got
+    # from the job cache if they're there, or saved to it after the last page.
+    def iter_tasks(self, job, cache=False):
+        if cache:
+            tasks = self.load_cached('clusrun-tasks', job.id, 'list[Task]')
+            if tasks is not None:
+                for task in tasks:
+                    yield task
+                return
+        get_page = functools.partial(self.api.get_clusrun_tasks, job.id)
+        tasks = []
+        for task in iter_pages(get_page, self.page_size, limit=len(job.target_nodes), prefetch=True):
+            if cache:
+                tasks.append(task)
+            yield task
+        if cache:
+            self.save_cached('clusrun-tasks', job.id, tasks)
+
+    def get_tasks(self, job, cache=False):
+        return list(self.iter_tasks(job, cache))
 
-    def wait_task_results(self, tasks):
-        return async_wait([self.__class__.GetTaskResult(self.api, t) for t in tasks], desc='Loading tasks')
+    def task_key(self, task):
+        return '%s-%s' % (task.job_id, task.id)
+
+    # Tasks and their results, in the order of tasks, as the results are got, up to a
+    # page of them ahead of the one yielded. Only tasks that are over have results got,
+    # since results of others could change, and those are saved in the job cache, so that
+    # they're got only once.
+    def iter_task_results(self, tasks):
+        # Ids of tasks whose results are known without a request
+        known = set()
+
+        def get_result(task):
+            result = None
+            if self.is_over(task):
+                result = self.load_cached('clusrun-task-result', self.task_key(task), 'TaskResult')
+                if result is None:
+                    return self.__class__.GetTaskResult(self.api, self.scheduler, task)
+            known.add(task.id)
+            return ReadyOp((task, result))
+
+        for task, result in async_iter((get_result(t) for t in tasks), self.page_size):
+            if task.id in known:
+                known.remove(task.id)
+            elif result is not None:
+                self.save_cached('clusrun-task-result', self.task_key(task), result)
+            yield task, result
+
+    # Task result and output of a task in the job cache, like that of GetTaskOutput, or None
+    def load_task_output(self, task):
+        result = self.load_cached('clusrun-task-result', self.task_key(task), 'TaskResult')
+        output = self.job_cache.get('clusrun-output', result.result_key) if result else None
+        return (task, result, output) if output is not None else None
+
+    def save_task_output(self, task, result, output):
+        if self.job_cache and result:
+            self.save_cached('clusrun-task-result', self.task_key(task), result)
+            self.job_cache.put('clusrun-output', result.result_key, output or '')
 
     class GetTaskOutput(AsyncOp):
-        def __init__(self, api, task):
+        # Policy of polling again for the task result or output not there or not over yet
+        retry = Poller(interval=0.1, max_interval=0.5, factor=1.5)
+
+        def __init__(self, api, scheduler, task):
             self.api = api
+            self.scheduler = scheduler
             self.task = task
+            self.retry_delays = self.retry.delays()
             self.async_task_result = self.get_task_result()
             self.task_result = None
             self.async_last_page = None
@@ -225,11 +475,11 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
             self.output = None
             self.ready = False
 
-        def get_task_result(self):
-            return self.api.get_clusrun_task_result(self.task.job_id, self.task.id, async=True)
+        def get_task_result(self, delay=0):
+            return self.call_later(delay, self.api.get_clusrun_task_result, self.task.job_id, self.task.id)
 
-        def get_last_page(self):
-            return self.api.get_clusrun_output_in_page(self.task_result.result_key, offset=-1, page_size=2, async=True)
+        def get_last_page(self, delay=0):
+            return self.call_later(delay, self.api.get_clusrun_output_in_page, self.task_result.result_key, offset=-1, page_size=2)
 
         def get_output(self):
             if not self.async_output.ready():
@@ -237,6 +487,7 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
             file = self.async_output.get()
             with open(file, "r") as f:
                 self.output = f.read()
+            os.remove(file)
             self.ready = True
 
         def try_get_last_page(self):
@@ -244,59 +495,293 @@ For help of a subcommand(list|show|new|cancel), execute "%(prog)s {subcommand} -
                 raise AsyncOp.NotReady()
             try:
                 page = self.async_last_page.get()
-            except ApiException as e:
+            except Command.ApiException as e:
                 # When output is not created(404), try again
-                self.async_last_page = self.get_last_page()
+                self.async_last_page = self.get_last_page(next(self.retry_delays))
             else:
                 if not page.eof:
                     # When output is not over, try again
-                    self.async_last_page = self.get_last_page()
+                    self.async_last_page = self.get_last_page(next(self.retry_delays))
                 else:
                     # When output is over
-                    self.async_output = self.api.get_clusrun_output(self.task_result.result_key, async=True)
+                    self.async_output = self.call(self.api.get_clusrun_output, self.task_result.result_key)
 
         def try_get_task_result(self):
             if not self.async_task_result.ready():
                 raise AsyncOp.NotReady()
             try:
                 self.task_result = self.async_task_result.get()
-            except ApiException as e:
+            except Command.ApiException as e:
                 # When task result is not created(404), try again
-                self.async_task_result = self.get_task_result()
+                self.async_task_result = self.get_task_result(next(self.retry_delays))
             else:
                 self.async_last_page = self.get_last_page()
 
         def get_result(self):
-            if self.ready:
-                return (self.task, self.task_result, self.output)
-            elif self.async_output:
-                self.get_output()
-            elif self.async_last_page:
-                self.try_get_last_page()
+            if not self.ready:
+                if self.async_output:
+                    self.get_output()
+                elif self.async_last_page:
+                    self.try_get_last_page()
+                else:
+                    self.try_get_task_result()
+            # NOTE: Return as soon as the output is got, since the op won't be signaled again.
+            if not self.ready:
+                raise AsyncOp.NotReady()
+            return (self.task, self.task_result, self.output)
+
+    class StreamTaskOutput(GetTaskOutput):
+        '''
+        Get the output of a task page by page from the beginning, and pass each page to
+        the handler as soon as it's got, rather than wait for the end of the output and
+        then get it as a whole. The task result is got again at the end for exit code.
+        '''
+
+        page_size = 64 * 1024
+
+        def __init__(self, api, scheduler, task, handler):
+            self.handler = handler
+            self.offset = 0
+            self.async_final_result = None
+            Clusrun.GetTaskOutput.__init__(self, api, scheduler, task)
+
+        # Get the next page, rather than the last one
+        def get_last_page(self, delay=0):
+            return self.call_later(delay, self.api.get_clusrun_output_in_page, self.task_result.result_key, offset=self.offset, page_size=self.page_size)
+
+        def try_get_last_page(self):
+            if not self.async_last_page.ready():
+                raise AsyncOp.NotReady()
+            try:
+                page = self.async_last_page.get()
+            except Command.ApiException as e:
+                # When output is not created(404), try again
+                self.async_last_page = self.get_last_page(next(self.retry_delays))
+                return
+            if page.size:
+                self.handler(self.task, page.content)
+                self.offset = (page.offset if page.offset is not None else self.offset) + page.size
+                # More could follow at once
+                self.retry_delays = self.retry.delays()
+            if not page.eof:
+                # The next page at once after a full one, or later when it's to be written
+                delay = 0 if page.size >= self.page_size else next(self.retry_delays)
+                self.async_last_page = self.get_last_page(delay)
+            else:
+                self.async_final_result = self.get_task_result()
+
+        def try_get_final_result(self):
+            if not self.async_final_result.ready():
+                raise AsyncOp.NotReady()
+            try:
+                self.task_result = self.async_final_result.get()
+            except Command.ApiException as e:
+                pass
+            self.ready = True
+
+        def get_result(self):
+            if not self.ready:
+                if self.async_final_result:
+                    self.try_get_final_result()
+                elif self.async_last_page:
+                    self.try_get_last_page()
+                else:
+                    self.try_get_task_result()
+            if not self.ready:
+                raise AsyncOp.NotReady()
+            return (self.task, self.task_result, None)
+
+    class SaveTaskOutput(StreamTaskOutput):
+        '''
+        Save the output of a task to a file page by page, appending each page to a
+        partial file, which is renamed to the path when the output is over. A partial file
+        left by a previous run is resumed from its size.
+        '''
+
+        page_size = 1024 * 1024
+
+        def __init__(self, api, scheduler, task, path):
+            self.path = path
+            self.partial_path = path + '.part'
+            Clusrun.StreamTaskOutput.__init__(self, api, scheduler, task, self.save_page)
+            # NOTE: This assumes the offsets of output pages are in bytes, as in the file.
+            self.offset = os.path.getsize(self.partial_path) if os.path.exists(self.partial_path) else 0
+
+        def save_page(self, task, content):
+            with open(self.partial_path, 'ab') as f:
+                f.write(content.encode('utf-8'))
+
+        def try_get_final_result(self):
+            Clusrun.StreamTaskOutput.try_get_final_result(self)
+            if not os.path.exists(self.partial_path):
+                # Empty output
+                open(self.partial_path, 'ab').close()
+            os.replace(self.partial_path, self.path)
+
+    def save_task_outputs(self, job, tasks):
+        # Files of a job are in a directory of its own, so that they're resumed or skipped
+        # only by a run for the same job.
+        dir = os.path.join(self.args.save_dir, str(job.id))
+        if not os.path.isdir(dir):
+            os.makedirs(dir)
+
+        # Node names are host names, but don't let one out of the directory anyway
+        path = lambda t: os.path.join(dir, '%s.log' % t.node.replace(os.sep, '_'))
+        missed = []
+        for task in tasks:
+            if os.path.exists(path(task)):
+                print('%s: %s exists' % (task.node, path(task)))
             else:
-                self.try_get_task_result()
-            raise AsyncOp.NotReady()
+                missed.append(task)
+
+        def show_saved(_, result):
+            task, task_result, _ = result
+            print('%s: %s saved, exit code %s' % (task.node, path(task), task_result.exit_code))
+
+        if missed:
+            ops = [self.__class__.SaveTaskOutput(self.api, self.scheduler, t, path(t)) for t in missed]
+            self.wait_task_outputs(ops, show_saved, 'Saving task output', done=len(tasks) - len(missed))
 
     def show_task_outputs(self, job):
-        tasks = self.wait_tasks(job)
+        # For a job that is over, tasks and their output are got from the job cache if
+        # they're there, and saved to it if not.
+        over = self.is_over(job)
+        tasks = self.get_tasks(job, cache=True) if over else self.wait_tasks(job)
         if not tasks:
             print("No tasks created!")
             return
 
+        if self.args.save_dir:
+            self.save_task_outputs(job, tasks)
+            return
+
+        cached = {}
+        if over and self.job_cache:
+            for task in tasks:
+                output = self.load_task_output(task)
+                if output:
+                    cached[task.id] = output
+        missed = [t for t in tasks if t.id not in cached]
+
+        if self.args.stream:
+            self.stream_task_outputs(missed, cached.values())
+            return
+
+        if self.args.collapse:
+            self.collapse_task_outputs(missed, cached.values())
+            return
+
         def show_output(_, result):
             task, task_result, output = result
             print('#### %s(%s) ####' % (task.node, task_result.exit_code))
             print(output or '')
 
-        async_wait([self.__class__.GetTaskOutput(self.api, t) for t in tasks], show_output, desc='Loading task output')
+        def show_and_save_output(_, result):
+            show_output(_, result)
+            if over:
+                self.save_task_output(*result)
 
-    def wait_tasks(self, job):
+        for result in cached.values():
+            show_output(None, result)
+        if missed:
+            ops = [self.__class__.GetTaskOutput(self.api, self.scheduler, t) for t in missed]
+            self.wait_task_outputs(ops, show_and_save_output, 'Loading task output', done=len(cached))
+
+    # Show each distinct output of tasks, and of cached output as for stream_task_outputs,
+    # once with the nodes of it. Output is hashed page by page as it comes, rather than
+    # kept, and the output of one node of each distinct one is got again to show it. So
+    # only a digest and node names are kept for each distinct output.
+    def collapse_task_outputs(self, tasks, cached=()):
+        # Hashes of output by task id, for tasks not over yet
+        hashes = {}
+        # Names of nodes, and result key of the first one, by output digest and exit code
+        groups = {}
+
+        def hash_page(task, content):
+            hashes.setdefault(task.id, hashlib.sha1()).update(content.encode('utf-8'))
+
+        def add_to_group(_, result):
+            task, task_result, _ = result
+            digest = hashes.pop(task.id, hashlib.sha1()).hexdigest()
+            group = groups.setdefault((digest, task_result.exit_code), ([], task_result.result_key))
+            group[0].append(task.node)
+
+        for task, task_result, output in cached:
+            hash_page(task, output)
+            add_to_group(None, (task, task_result, None))
+        if tasks:
+            ops = [self.__class__.StreamTaskOutput(self.api, self.scheduler, t, hash_page) for t in tasks]
+            self.wait_task_outputs(ops, add_to_group, 'Loading task output', done=len(cached))
+
+        # The most common output first
+        for (_, exit_code), (nodes, result_key) in sorted(groups.items(), key=lambda g: -len(g[1][0])):
+            print('#### %s(%s) ####' % (compress_hostlist(nodes), exit_code))
+            for content in self.iter_output(result_key):
+                sys.stdout.write(content)
+            print('')
+
+    # Content of output pages from the beginning, from the job cache if it's there
+    def iter_output(self, result_key):
+        output = self.job_cache.get('clusrun-output', result_key) if self.job_cache else None
+        if output is not None:
+            yield output
+            return
+        offset = 0
         while True:
-            job = self.api.get_clusrun_job(job.id)
-            tasks = self.api.get_clusrun_tasks(job.id, count=len(job.target_nodes))
-            if tasks or job.state in ['Finished', 'Failed', 'Canceled']:
+            page = self.api.get_clusrun_output_in_page(result_key, offset=offset, page_size=self.StreamTaskOutput.page_size)
+            if page.size:
+                yield page.content
+                offset = (page.offset if page.offset is not None else offset) + page.size
+            if page.eof or not page.size:
                 break
-            # TODO: Sleep and wait for some time here?
+
+    # Stream output of tasks, and show cached output, each of which is a tuple of task, task
+    # result and output.
+    def stream_task_outputs(self, tasks, cached=()):
+        # The incomplete last line of output of each task, by task id
+        partial_lines = {}
+
+        def show_page(task, content):
+            lines = (partial_lines.pop(task.id, '') + content).split('\n')
+            last = lines.pop()
+            for line in lines:
+                print('%s: %s' % (task.node, line))
+            if len(last) >= self.StreamTaskOutput.page_size:
+                # Don't keep too long a line in memory
+                print('%s: %s' % (task.node, last))
+            elif last:
+                partial_lines[task.id] = last
+
+        def show_end(_, result):
+            task, task_result, _ = result
+            last = partial_lines.pop(task.id, None)
+            if last is not None:
+                print('%s: %s' % (task.node, last))
+            print('%s: #### exit code %s ####' % (task.node, task_result.exit_code))
+
+        for task, task_result, output in cached:
+            show_page(task, output)
+            show_end(None, (task, task_result, None))
+        if tasks:
+            ops = [self.__class__.StreamTaskOutput(self.api, self.scheduler, t, show_page) for t in tasks]
+            self.wait_task_outputs(ops, show_end, 'Streaming task output', done=len(cached))
+
+    def wait_tasks(self, job):
+        def get_tasks():
+            j = self.api.get_clusrun_job(job.id)
+            return (j, self.api.get_clusrun_tasks(j.id, count=len(j.target_nodes)))
+
+        poller = self.poller()
+        if self.deadline is not None:
+            # Waiting for tasks is in the time by "--task-timeout" too
+            remaining = max(self.deadline - time.time(), 0)
+            poller.timeout = remaining if poller.timeout is None else min(poller.timeout, remaining)
+        with span('phase', 'Waiting for tasks'):
+            _, tasks = poller.poll(
+                get_tasks,
+                lambda r: r[1] or r[0].state in ['Finished', 'Failed', 'Canceled'],
+                state=lambda r: r[0].state
+            )
         return tasks
 
 def main():
@@ -1,17 +1,27 @@
 from __future__ import print_function
 import sys
+import time
 import os.path
 import shutil
 import signal
+import threading
+import functools
+import json
 import argparse
 import getpass
+from collections import OrderedDict
+from itertools import islice, takewhile
 from hpc_acm_cli.parser_builder import ParserBuilder
 from hpc_acm_cli.easy_config import EasyConfig
-from hpc_acm_cli.aad import get_access_token
-import hpc_acm
-from hpc_acm.configuration import Configuration
-from hpc_acm.api_client import ApiClient
-from hpc_acm.rest import ApiException
+from hpc_acm_cli.async_op import AsyncOp, Scheduler, async_wait
+from hpc_acm_cli.polling import Poller
+from hpc_acm_cli.progress import Progress
+from hpc_acm_cli.utils import compile_pattern, compile_patterns, iter_pages, parse_ids, parse_time, to_time, get_field, print_records, print_json_line
+from hpc_acm_cli.node_cache import NodeCache
+from hpc_acm_cli.hostlist import expand_hostlist
+from hpc_acm_cli.daemon import forward
+from hpc_acm_cli.job_cache import JobCache
+from hpc_acm_cli.trace import instrument, span, tracing
 
 # Turn off warning for unverified SSL certificate, but still allow user to turn
 # it on by setting envrionment variable "PYTHONWARNINGS=default".
@@ -41,20 +51,309 @@ class PasswordPrompt(argparse.Action):
         password = getpass.getpass()
         setattr(args, self.dest, password)
 
+# Parse endpoint limits like "get_clusrun_output=8 get_clusrun_output_in_page=16"
+def endpoint_limits(value):
+    limits = {}
+    for item in value.split():
+        name, sep, limit = item.partition('=')
+        try:
+            limits[name] = int(limit)
+        except ValueError:
+            raise argparse.ArgumentTypeError('invalid endpoint limit "%s"' % item)
+        if not name or limits[name] < 1:
+            raise argparse.ArgumentTypeError('invalid endpoint limit "%s"' % item)
+    return limits
+
+# A response with JSON text, for the API client to deserialize models from
+class JsonResponse:
+    def __init__(self, data):
+        self.data = data
+
+def time_value(value):
+    try:
+        return parse_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 class Command:
     config_file_name = '.hpc_acm_cli_config'
     config_dir = os.path.expanduser('~')
     config_path = os.path.join(config_dir, config_file_name)
+    node_cache_path = os.path.join(config_dir, '.hpc_acm_cli_node_cache')
+    token_cache_path = os.path.join(config_dir, '.hpc_acm_cli_token_cache')
+    job_cache_path = os.path.join(config_dir, '.hpc_acm_cli_job_cache')
+    daemon_socket_path = os.path.join(config_dir, '.hpc_acm_cli_daemon')
+
+    job_end_states = ['Finished', 'Failed', 'Canceled']
+
+    # The exception of failed API calls, like those of 404. It's of the SDK, and so set by
+    # connect, when a command is to run, since the SDK is not imported at startup.
+    ApiException = None
+
+    # Number of nodes, jobs, etc. to get in a request when going through all of them
+    page_size = 1000
+
+    # Objects shared by commands run in a process, like those of "clus shell", or those
+    # in threads of "clus daemon", by keys of what they depend on. None when a process runs
+    # a single command.
+    shared = None
+    shared_lock = threading.Lock()
 
     def __init__(self, args):
-        config = Configuration()
-        config.host = args.host
+        limits = tuple(sorted(args.endpoint_limits.items()))
+        key = ('api', args.host, args.issuer_url, args.client_id, args.max_in_flight, limits, args.engine)
+        self.api, self.scheduler = self.get_shared(key, lambda: self.connect(args))
         if args.issuer_url:
-            config.access_token = get_access_token(args.issuer_url, args.client_id, args.client_secret)
-        api_client = ApiClient(config)
-        self.api = hpc_acm.DefaultApi(api_client)
+            from hpc_acm_cli.aad import get_access_token
+            # The token is got from the token cache unless it's to expire
+            with span('phase', 'get access token'):
+                self.api.api_client.configuration.access_token = get_access_token(
+                    args.issuer_url, args.client_id, args.client_secret, self.token_cache_path)
+        self.job_cache = None
+        if getattr(args, 'job_cache_size', 0) > 0 and not args.no_job_cache:
+            key = ('job_cache', args.host, args.job_cache_size)
+            self.job_cache = self.get_shared(key, lambda: JobCache(self.job_cache_path, args.host, args.job_cache_size * 1024 * 1024))
+        # Time when each task is first seen over by watch_progress, by task id
+        self.over_at = {}
         self.args = args
 
+    # Create an API client and a scheduler of requests by it
+    def connect(self, args):
+        # NOTE: The SDK and the auth modules are imported only when a command is to run,
+        # so that help and argument errors are shown without loading them.
+        import hpc_acm
+        from hpc_acm.configuration import Configuration
+        from hpc_acm.api_client import ApiClient
+        from hpc_acm.rest import ApiException
+        Command.ApiException = ApiException
+        config = Configuration()
+        config.host = args.host
+        # Keep a connection for each request in flight
+        config.connection_pool_maxsize = max(config.connection_pool_maxsize, args.max_in_flight)
+        api = instrument(hpc_acm.DefaultApi(ApiClient(config)))
+        if args.engine == 'asyncio':
+            from hpc_acm_cli.aio import AioScheduler
+            scheduler = AioScheduler(api, args.max_in_flight, args.endpoint_limits)
+        else:
+            scheduler = Scheduler(args.max_in_flight, args.endpoint_limits)
+        return api, scheduler
+
+    def get_shared(self, key, create):
+        if self.shared is None:
+            return create()
+        with self.shared_lock:
+            if key not in self.shared:
+                self.shared[key] = create()
+            return self.shared[key]
+
+    # Yield nodes whose names match the patterns, if any, page by page
+    def iter_nodes(self, pattern=None, last_id=None, page_size=None):
+        match = compile_patterns(pattern) if pattern else None
+        for node in iter_pages(self.api.get_nodes, page_size or self.page_size, last_id):
+            if not match or match(node.name):
+                yield node
+
+    # Names of target nodes of a new job, by the "--nodes" or "--pattern" parameter
+    def target_nodes(self):
+        with span('phase', 'resolve nodes'):
+            return self.resolve_nodes()
+
+    def resolve_nodes(self):
+        if self.args.nodes:
+            return list(OrderedDict.fromkeys(expand_hostlist(self.args.nodes)))
+        elif self.args.pattern:
+            if self.args.no_cache:
+                return [n.name for n in self.iter_nodes(self.args.pattern)]
+            cache = NodeCache(self.node_cache_path, self.args.host, self.args.node_cache_ttl)
+            names = cache.names(self.iter_nodes, refresh=self.args.refresh_nodes)
+            match = compile_patterns(self.args.pattern)
+            return [n for n in names if match(n)]
+        else:
+            raise ValueError('Either nodes or pattern parameter must be provided!')
+
+    class CancelJob(AsyncOp):
+        def __init__(self, scheduler, cancel, id):
+            self.scheduler = scheduler
+            self.id = id
+            self.async_cancel = self.call(cancel, id, job={ "request": "cancel" })
+
+        def get_result(self):
+            if not self.async_cancel.ready():
+                raise AsyncOp.NotReady()
+            try:
+                self.async_cancel.get()
+            except Exception as e:
+                return (self.id, e)
+            return (self.id, None)
+
+    # Cancel jobs by the "ids", "--active" and "--match" parameters of a "cancel" subcommand,
+    # concurrently, and then show a summary. get_jobs is the API to list jobs, cancel is the
+    # one to cancel a job, and describe(job) is the text of a job for "--match".
+    def cancel_jobs(self, get_jobs, cancel, describe):
+        if not self.args.ids and not self.args.active:
+            raise ValueError('Either ids or active parameter must be provided!')
+        ids = list(parse_ids(self.args.ids))
+        if self.args.active:
+            match = compile_pattern(self.args.match) if self.args.match else None
+            for job in iter_pages(functools.partial(get_jobs, reverse=True), self.page_size):
+                if not self.is_over(job) and (not match or match(describe(job))):
+                    ids.append(job.id)
+        # Remove duplicates and keep the order
+        ids = list(OrderedDict.fromkeys(ids))
+        if not ids:
+            print('No job to cancel.')
+            return
+
+        results = async_wait([self.CancelJob(self.scheduler, cancel, id) for id in ids], desc='Canceling jobs')
+        failures = [r for r in results if r[1] is not None]
+
+        def error(e):
+            return '(%s) %s' % (e.status, e.reason) if hasattr(e, 'status') else str(e)
+
+        result = {
+            'title': 'Result',
+            'value': lambda r: 'Failed' if r[1] is not None else 'Canceled'
+        }
+        message = {
+            'title': 'Error',
+            'value': lambda r: error(r[1]) if r[1] is not None else ''
+        }
+        self.print_table([{ 'title': 'Id', 'value': lambda r: r[0] }, result, message], results)
+        if self.args.output != 'table':
+            return
+        print('%d canceled, %d failed.' % (len(results) - len(failures), len(failures)))
+
+    # Print elements of collection in the format by the "--output" parameter
+    def print_table(self, fields, collection):
+        with span('phase', 'print'):
+            print_records(fields, collection, self.args.output, self.serialize)
+
+    # JSON object of a model as it's sent by the API server, or None for a non-model
+    def serialize(self, element):
+        if hasattr(element, 'swagger_types'):
+            return self.api.api_client.sanitize_for_serialization(element)
+        return None
+
+    # Elements of a list API, by the "--count" and "--last-id" parameters for a page, or
+    # by the "--all" and "--limit" parameters for pages after pages. With "--output jsonl"
+    # they're objects right from the response, not deserialized to models.
+    # With conditions, pages are queried until "--limit" or "--count" elements meeting all
+    # of them, or until an element for which over(element) is true, if any, since no more
+    # element after it could meet them.
+    def list_objects(self, api, conditions=(), over=None, **kwargs):
+        if self.args.output == 'jsonl':
+            api = functools.partial(self.get_raw_objects, api)
+            get_id = lambda o: o['id']
+        else:
+            get_id = lambda e: e.id
+        get_page = functools.partial(api, **kwargs)
+        if not (conditions or self.args.all or self.args.limit):
+            return get_page(count=self.args.count, last_id=self.args.last_id)
+        objects = iter_pages(get_page, self.page_size, self.args.last_id, get_id,
+                             limit=None if conditions else self.args.limit, prefetch=not self.args.no_prefetch)
+        if conditions:
+            if over:
+                objects = takewhile(lambda o: not over(o), objects)
+            objects = (o for o in objects if all(c(o) for c in conditions))
+            if not self.args.all:
+                objects = islice(objects, self.args.limit or self.args.count)
+        return objects
+
+    # Conditions on jobs by the "--state", "--node", "--since" and "--until" parameters,
+    # and the predicate for list_objects to stop at, for jobs listed in order of id
+    def job_filters(self):
+        args = self.args
+        conditions = self.state_conditions()
+        if args.node:
+            match = compile_patterns(args.node)
+            conditions.append(lambda j: any(match(n) for n in get_field(j, 'target_nodes') or []))
+        created_at = lambda j: to_time(get_field(j, 'created_at'))
+        if args.since:
+            conditions.append(lambda j: created_at(j) >= args.since)
+        if args.until:
+            conditions.append(lambda j: created_at(j) <= args.until)
+        over = None
+        if args.asc and args.until:
+            over = lambda j: created_at(j) > args.until
+        elif not args.asc and args.since:
+            over = lambda j: created_at(j) < args.since
+        return conditions, over
+
+    # Conditions on jobs or nodes by the "--state" parameter
+    def state_conditions(self):
+        if not self.args.state:
+            return []
+        states = set(s.lower() for s in self.args.state.split(','))
+        return [lambda o: (get_field(o, 'state') or '').lower() in states]
+
+    def get_raw_objects(self, api, **kwargs):
+        resp = api(_preload_content=False, **kwargs)
+        return json.loads(resp.data.decode('utf-8'))
+
+    def print_json_lines(self, objects):
+        for obj in objects:
+            print_json_line(obj)
+
+    def is_over(self, job):
+        return job.state in self.job_end_states
+
+    # Get a model by get(), or from the job cache if it's there. When it's not, it's saved
+    # to the cache if save(model) is true, which should be only for something of a job
+    # that is over, since it won't change any more then.
+    def get_cached(self, kind, id, type, get, save=lambda _: True):
+        model = self.load_cached(kind, id, type)
+        if model is None:
+            model = get()
+            if save(model):
+                self.save_cached(kind, id, model)
+        return model
+
+    # A model from the job cache, or None when it's not there
+    def load_cached(self, kind, id, type):
+        data = self.job_cache.get(kind, id) if self.job_cache else None
+        if data is None:
+            return None
+        return self.api.api_client.deserialize(JsonResponse(data), type)
+
+    def save_cached(self, kind, id, model):
+        if self.job_cache:
+            self.job_cache.put(kind, id, json.dumps(self.api.api_client.sanitize_for_serialization(model)))
+
+    # Poller of job state, with the timeout by the "--poll-timeout" parameter if any
+    def poller(self):
+        return Poller(timeout=getattr(self.args, 'poll_timeout', None))
+
+    # With the "--progress" parameter, show counts of tasks of a job by state until the job
+    # is over, and return the job then. Counts are from snapshots of tasks got page by
+    # page every "--progress-interval" seconds, rather than from each task. get_job(id)
+    # and get_tasks(id, count, last_id) are the APIs of the job. With until(counts), it
+    # stops when that is true, even if the job is not over. The time each task is first
+    # seen over is kept in over_at, by task id.
+    def watch_progress(self, job, get_job, get_tasks, until=None):
+        if not self.args.progress or self.is_over(job):
+            return job
+
+        def seen(tasks):
+            for task in tasks:
+                if task.state in Progress.end_states and task.id not in self.over_at:
+                    self.over_at[task.id] = time.time()
+                yield task
+
+        def snapshot():
+            j = get_job(job.id)
+            tasks = iter_pages(functools.partial(get_tasks, j.id), self.page_size, limit=len(j.target_nodes))
+            return (j, Progress.count(seen(tasks)))
+
+        interval = self.args.progress_interval
+        progress = Progress(len(job.target_nodes), interval)
+        # At a fixed interval, rather than backing off, for a steady view
+        poller = Poller(interval=interval, max_interval=interval, factor=1, jitter=0, timeout=getattr(self.args, 'poll_timeout', None))
+        with span('phase', 'Watching progress'):
+            over = lambda r: self.is_over(r[0]) or (until is not None and until(r[1]))
+            job, counts = poller.poll(snapshot, over, progress=lambda r: progress.update(r[1]))
+        progress.close(counts)
+        return job
+
     @classmethod
     def profile(cls):
         return {}
@@ -67,6 +366,166 @@ class Command:
     def subcommands(cls, config):
         return []
 
+    # Parameters of a "cancel" subcommand
+    @classmethod
+    def cancel_params(cls, config):
+        return [
+            {
+                'name': 'ids',
+                'options': {
+                    'help': 'job id, or a range of ids like "10-20", or "-" for ids separated by whitespaces from stdin',
+                    'metavar': 'id',
+                    'nargs': '*'
+                }
+            },
+            {
+                'name': '--active',
+                'options': {
+                    'help': 'cancel all jobs that are not over yet, in addition to those by ids',
+                    'action': 'store_true'
+                }
+            },
+            {
+                'name': '--match',
+                'options': { 'help': 'glob pattern to select jobs for the --active parameter' }
+            },
+        ]
+
+    # Parameters of a "list" subcommand for more than a page
+    @classmethod
+    def paging_params(cls, config):
+        return [
+            {
+                'group': True,
+                'items': [
+                    {
+                        'name': '--all',
+                        'options': {
+                            'help': 'query all, page by page, instead of a page by the --count parameter',
+                            'action': 'store_true'
+                        }
+                    },
+                    {
+                        'name': '--limit',
+                        'options': {
+                            'help': 'query up to the number, page by page, instead of a page by the --count parameter',
+                            'type': int
+                        }
+                    },
+                ]
+            },
+            {
+                'name': '--no-prefetch',
+                'options': {
+                    'help': 'do not query the next page while printing the current one, for the --all and --limit parameters',
+                    'action': 'store_true'
+                }
+            },
+        ]
+
+    # Parameters of a "list" subcommand of jobs to filter them
+    @classmethod
+    def job_filter_params(cls, config):
+        return [
+            {
+                'name': '--state',
+                'options': { 'help': 'states of jobs to query, separated by commas, like "Failed,Canceled"' }
+            },
+            {
+                'name': '--node',
+                'options': { 'help': 'name patterns of nodes, one of which is a target node of jobs to query, in the form of the --pattern parameter of a new job' }
+            },
+            {
+                'name': '--since',
+                'options': {
+                    'help': 'time since which jobs to query are created, like "2018-10-18 10:30", or "12h" for 12 hours ago. "s", "m" and "d" are for seconds, minutes and days.',
+                    'type': time_value
+                }
+            },
+            {
+                'name': '--until',
+                'options': {
+                    'help': 'time until which jobs to query are created, in the form of the --since parameter',
+                    'type': time_value
+                }
+            },
+        ]
+
+    # Parameters of a "show" subcommand for the local cache of jobs that are over
+    @classmethod
+    def job_cache_params(cls, config):
+        return [
+            {
+                'name': '--no-job-cache',
+                'options': {
+                    'help': 'do not use the local cache of jobs that are over, with their tasks, results and output',
+                    'action': 'store_true'
+                }
+            },
+            {
+                'name': '--job-cache-size',
+                'options': {
+                    'help': 'size in MB of the local cache of jobs, over which the least recently used are removed. 0 for no cache.',
+                    'type': int,
+                    'default': config.getint('DEFAULT', 'job_cache_size', fallback=256)
+                }
+            },
+        ]
+
+    # Parameters of a "show" or "new" subcommand for the view of progress of tasks
+    @classmethod
+    def progress_params(cls, config):
+        return [
+            {
+                'name': '--progress',
+                'options': {
+                    'help': 'unless with --short, show counts of tasks by state, with throughput and ETA, until the job is over, before the rest',
+                    'action': 'store_true'
+                }
+            },
+            {
+                'name': '--progress-interval',
+                'options': {
+                    'help': 'seconds between updates of counts of tasks for the --progress parameter, each of which gets all tasks page by page',
+                    'type': float,
+                    'default': config.getfloat('DEFAULT', 'progress_interval', fallback=2)
+                }
+            },
+        ]
+
+    # Parameters for the node cache used by the "--pattern" parameter of a "new" subcommand
+    @classmethod
+    def node_cache_params(cls, config):
+        return [
+            {
+                'group': True,
+                'items': [
+                    {
+                        'name': '--no-cache',
+                        'options': {
+                            'help': 'do not use the local cache of node names for the --pattern parameter',
+                            'action': 'store_true'
+                        }
+                    },
+                    {
+                        'name': '--refresh-nodes',
+                        'options': {
+                            'help': 'refresh all names in the local cache of node names before using it',
+                            'action': 'store_true'
+                        }
+                    },
+                ]
+            },
+            {
+                'name': '--node-cache-ttl',
+                'options': {
+                    'help': 'seconds to use the local cache of node names as it is, before refreshing it',
+                    'type': float,
+                    'default': config.getfloat('DEFAULT', 'node_cache_ttl', fallback=300)
+                }
+            },
+        ]
+
     @classmethod
     def build_spec(cls, config):
         options = {
@@ -93,6 +552,52 @@ class Command:
                 'name': '--host', # NOTE: "--base-point" seems a more meaningful name.
                 'options': { 'help': 'the API end point', 'default': config.get('DEFAULT', 'host', fallback=None) }
             },
+            {
+                'name': '--max-in-flight',
+                'options': {
+                    'help': 'maximum number of concurrent requests to the API server',
+                    'type': int,
+                    'default': config.getint('DEFAULT', 'max_in_flight', fallback=16)
+                }
+            },
+            {
+                'name': '--endpoint-limits',
+                'options': {
+                    'help': 'maximum numbers of concurrent requests to some APIs. Multiple limits are separated by spaces and quoted as one string, like "get_clusrun_output=4 get_clusrun_output_in_page=8".',
+                    'type': endpoint_limits,
+                    'default': config.get('DEFAULT', 'endpoint_limits', fallback='')
+                }
+            },
+            {
+                'name': '--engine',
+                'options': {
+                    'help': 'how concurrent requests are made: by a thread each, or by coroutines in one thread over a shared HTTP session. The "asyncio" engine requires Python 3 and the "aiohttp" package.',
+                    'choices': ['thread', 'asyncio'],
+                    'default': config.get('DEFAULT', 'engine', fallback='thread')
+                }
+            },
+            {
+                'name': '--stats',
+                'options': {
+                    'help': 'print to stderr the time of each phase, and the count, errors, retries, bytes and latency percentiles of requests to each API',
+                    'action': 'store_true'
+                }
+            },
+            {
+                'name': '--trace',
+                'options': {
+                    'help': 'save the timeline of phases and requests to the file in the Chrome trace format, which can be viewed by chrome://tracing or https://ui.perfetto.dev',
+                    'metavar': 'FILE'
+                }
+            },
+            {
+                'name': '--output',
+                'options': {
+                    'help': 'format of output for jobs, nodes, tasks, etc.: ASCII tables, JSON Lines, CSV or TSV',
+                    'choices': ['table', 'jsonl', 'csv', 'tsv'],
+                    'default': config.get('DEFAULT', 'output', fallback='table')
+                }
+            },
         ]
         params = cls.params(config)
         if params:
@@ -131,30 +636,56 @@ class Command:
     @classmethod
     def run(cls):
         signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(100))
+        # Run by the daemon of "clus daemon" if it's running, or on its own
+        code = forward(cls.daemon_socket_path, cls.__name__, sys.argv[1:])
+        if code is None:
+            code = cls.execute(sys.argv[1:])
+        if code:
+            sys.exit(code)
+
+    # Run a command by argv, the command line without the program name, and return the
+    # exit code, or None for success.
+    @classmethod
+    def execute(cls, argv, prog=None):
         try:
             config = cls.read_default_config()
         except FileNotFoundError as e:
             config = EasyConfig()
             print(e, file=sys.stderr)
         spec = cls.build_spec(config)
-        parser = ParserBuilder.build(spec)
-        args = parser.parse_args()
+        if prog:
+            spec['options']['prog'] = prog
+        parser = ParserBuilder.build(spec, argv)
+        args = parser.parse_args(argv)
         cmd = getattr(args, 'command', None)
         if cmd:
             got = getattr(cls, cmd)
         else:
             got = getattr(cls, 'main', None)
         if got:
+            with tracing(getattr(args, 'stats', False), getattr(args, 'trace', None)):
+                return cls.call(args, cmd or 'main', parser)
+        else:
+            parser.print_help()
+
+    # Run the method of name of a command by args, and return the exit code, or None for
+    # success
+    @classmethod
+    def call(cls, args, name, parser):
+        with span('command', name):
             obj = cls(args)
-            cmd = getattr(obj, cmd)
+            cmd = getattr(obj, name)
             try:
                 cmd()
             except ValueError as e:
                 print('Error: %s' % e)
                 parser.print_help()
-                sys.exit(1)
+                return 1
+            except BrokenPipeError:
+                # Output is piped to a command like "head", which has exited. Redirect
+                # stdout to null, so that flushing it at exit doesn't fail again.
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                return 1
             except Exception as e:
                 print('Error: %s' % e)
-                sys.exit(2)
-        else:
-            parser.print_help()
+                return 2
@@ -0,0 +1,313 @@
+from __future__ import print_function
+import io
+import os
+import sys
+import json
+import ctypes
+import socket
+import struct
+import threading
+
+# Messages between the daemon and a command are frames of a kind, a length and data.
+# A command sends a request in JSON, and the daemon accepts it, sends the output of
+# stdout and stderr of the command as it comes, and then the exit code. When the command
+# is gone, like when it's interrupted, the daemon cancels the command.
+REQUEST = b'q'
+ACCEPT = b'a'
+STDOUT = b'1'
+STDERR = b'2'
+EXIT = b'x'
+
+# Seconds for a command to wait for the daemon to accept it, before it runs on its own
+timeout = 5
+
+# When set, commands run on their own even if the daemon is running
+bypass_env = 'HPC_ACM_CLI_NO_DAEMON'
+
+def send_frame(sock, kind, data):
+    sock.sendall(kind + struct.pack('>I', len(data)) + data)
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+def recv_frame(sock):
+    header = recv_exactly(sock, 5)
+    return header[:1], recv_exactly(sock, struct.unpack('>I', header[1:])[0])
+
+class FrameWriter:
+    '''
+    A text file sending what's written in frames of a kind. When the command is gone,
+    like when it's interrupted, what's written is dropped, so that the command in the
+    daemon runs to the end without errors.
+    '''
+
+    encoding = 'utf-8'
+
+    def __init__(self, sock, kind):
+        self.sock = sock
+        self.kind = kind
+        self.gone = False
+
+    def write(self, text):
+        if text and not self.gone:
+            try:
+                send_frame(self.sock, self.kind, text.encode('utf-8'))
+            except OSError:
+                self.gone = True
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+class ThreadStream:
+    '''
+    A file in place of sys.stdout, sys.stderr or sys.stdin in the daemon, which is that
+    of the command run by the current thread, or the original file of the daemon in other
+    threads.
+    '''
+
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def set(self, file):
+        self.local.file = file
+
+    def current(self):
+        return getattr(self.local, 'file', None) or self.default
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+class WorkDir:
+    '''
+    The working directory of commands in the daemon, which is that of the process, and
+    so shared by them. Commands in the same directory run at the same time, while one in
+    another directory waits for them to end.
+    '''
+
+    def __init__(self):
+        self.path = None
+        self.users = 0
+        self.condition = threading.Condition()
+
+    def enter(self, path):
+        with self.condition:
+            while self.users and self.path != path:
+                self.condition.wait()
+            if self.path != path:
+                os.chdir(path)
+                self.path = path
+            self.users += 1
+
+    def exit(self):
+        with self.condition:
+            self.users -= 1
+            self.condition.notify_all()
+
+def available():
+    return hasattr(socket, 'AF_UNIX')
+
+def connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+# Run a command by the daemon listening at path, and return the exit code, or None when
+# there's no daemon, or it doesn't accept the command in time, and then the command
+# should run on its own.
+def forward(path, command, argv):
+    if not available() or not os.path.exists(path) or os.environ.get(bypass_env):
+        return None
+    # The daemon can't prompt for the secret
+    if any(a.startswith('--client-secret') for a in argv):
+        return None
+    sock = connect(path)
+    if not sock:
+        return None
+    request = {
+        'command': command,
+        'argv': argv,
+        'cwd': os.getcwd(),
+        # For "-" for ids from stdin
+        'stdin': sys.stdin.read() if '-' in argv else None,
+    }
+    try:
+        send_frame(sock, REQUEST, json.dumps(request).encode('utf-8'))
+        kind, _ = recv_frame(sock)
+        if kind != ACCEPT:
+            raise EOFError()
+    except (EOFError, OSError):
+        # Not accepted in time, and then it's canceled by the daemon when the socket is closed
+        sock.close()
+        print('Warning: the daemon at %s is not responding. Running on its own.' % path, file=sys.stderr)
+        return None
+    # The command may run for long
+    sock.settimeout(None)
+    try:
+        while True:
+            kind, data = recv_frame(sock)
+            if kind == EXIT:
+                return int(data)
+            file = sys.stdout if kind == STDOUT else sys.stderr
+            file.write(data.decode('utf-8'))
+            file.flush()
+    except BrokenPipeError:
+        # Output is piped to a command like "head", which has exited, as in Command.execute
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (EOFError, OSError):
+        print('Error: lost the daemon at %s' % path, file=sys.stderr)
+        return 2
+    finally:
+        sock.close()
+
+def stop(path):
+    sock = connect(path) if available() and os.path.exists(path) else None
+    if not sock:
+        print('No daemon is running at %s' % path)
+        return
+    with sock:
+        send_frame(sock, REQUEST, json.dumps({ 'stop': True }).encode('utf-8'))
+        recv_frame(sock)
+
+# Serve commands from the socket at path by the shell, each in a thread, until stopped
+def serve(path, shell):
+    if not available():
+        raise ValueError('Unix domain sockets are not supported on this platform!')
+    if os.path.exists(path):
+        sock = connect(path)
+        if sock:
+            sock.close()
+            print('A daemon is running at %s already' % path, file=sys.stderr)
+            sys.exit(1)
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the user can connect to it
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(16)
+    print('Serving at %s' % path)
+    sys.stdout.flush()
+    streams = (sys.stdout, sys.stderr, sys.stdin)
+    sys.stdout, sys.stderr, sys.stdin = [ThreadStream(f) for f in streams]
+    workdir = WorkDir()
+    stopped = threading.Event()
+
+    def serve_connection(conn):
+        with conn:
+            if not handle(conn, shell, workdir):
+                stopped.set()
+                # Wake up the accept
+                close(connect(path))
+
+    try:
+        while not stopped.is_set():
+            conn, _ = server.accept()
+            thread = threading.Thread(target=serve_connection, args=(conn,))
+            thread.daemon = True
+            thread.start()
+    finally:
+        sys.stdout, sys.stderr, sys.stdin = streams
+        server.close()
+        os.remove(path)
+
+def close(sock):
+    if sock:
+        sock.close()
+
+# Handle a request, and return False when it's to stop the daemon
+def handle(conn, shell, workdir):
+    try:
+        kind, data = recv_frame(conn)
+        request = json.loads(data.decode('utf-8'))
+    except (EOFError, OSError, ValueError):
+        return True
+    if request.get('stop'):
+        send_frame(conn, EXIT, b'0')
+        return False
+    from hpc_acm_cli.shell import names
+    try:
+        send_frame(conn, ACCEPT, b'')
+    except OSError:
+        return True
+    sys.stdout.set(FrameWriter(conn, STDOUT))
+    sys.stderr.set(FrameWriter(conn, STDERR))
+    sys.stdin.set(io.StringIO(request.get('stdin') or ''))
+    command = Cancelable(conn)
+    try:
+        workdir.enter(request['cwd'])
+        try:
+            code = command.run(lambda: shell.dispatch([names[request['command']]] + request['argv']))
+        finally:
+            workdir.exit()
+    except Exception as e:
+        print('Error: %s' % e)
+        code = 2
+    finally:
+        sys.stdout.flush()
+        for stream in (sys.stdout, sys.stderr, sys.stdin):
+            stream.set(None)
+    try:
+        send_frame(conn, EXIT, str(code or 0).encode('utf-8'))
+    except OSError:
+        pass
+    return True
+
+class Cancelable:
+    '''
+    A command run in the current thread for a connection, which is canceled when the
+    connection is closed by the other end, like when the command is interrupted, by
+    raising KeyboardInterrupt in the thread, as by Ctrl-C for a command on its own. A
+    command blocked in a call is canceled when it's back in Python code.
+    '''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.thread_id = threading.current_thread().ident
+        self.running = False
+        self.lock = threading.Lock()
+
+    def run(self, func):
+        with self.lock:
+            self.running = True
+        watcher = threading.Thread(target=self.watch)
+        watcher.daemon = True
+        watcher.start()
+        try:
+            try:
+                return func()
+            finally:
+                with self.lock:
+                    self.running = False
+        except KeyboardInterrupt:
+            # Canceled after the command ended
+            return 100
+
+    # Wait for the other end to close the connection, as it sends nothing after the request
+    def watch(self):
+        try:
+            while self.conn.recv(1024):
+                pass
+        except OSError:
+            pass
+        with self.lock:
+            if self.running:
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_id), ctypes.py_object(KeyboardInterrupt))
@@ -1,11 +1,10 @@
 from __future__ import print_function
-import time
 import datetime
 import sys
 import json
-from hpc_acm.rest import ApiException
 from hpc_acm_cli.command import Command
-from hpc_acm_cli.utils import print_table, match_names, arrange
+from hpc_acm_cli.utils import compile_pattern, get_field, arrange, arrange_nodes
+from hpc_acm_cli.hostlist import compress_hostlist
 
 class Diagnostics(Command):
     @classmethod
@@ -48,7 +47,11 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
                         'name': '--asc',
                         'options': { 'help': 'query in id-ascending order', 'action': 'store_true' }
                     },
-                ],
+                    {
+                        'name': '--test',
+                        'options': { 'help': 'pattern of names of tests, in the form of "category-name", of jobs to query' }
+                    },
+                ] + cls.paging_params(config) + cls.job_filter_params(config),
             },
             {
                 'name': 'show',
@@ -67,7 +70,14 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
                             'action': 'store_true'
                         }
                     },
-                ],
+                    {
+                        'name': '--poll-timeout',
+                        'options': {
+                            'help': 'seconds to wait for the job state before giving up. By default, it waits forever.',
+                            'type': float,
+                        }
+                    },
+                ] + cls.progress_params(config) + cls.job_cache_params(config),
             },
             {
                 'name': 'new',
@@ -81,13 +91,13 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
                             {
                                 'name': '--nodes',
                                 'options': {
-                                    'help': 'names of nodes. Multiple names are separated by spaces and quoted as one string, like "node1 node2 node3". Either this or the --pattern parameter must be provided.',
+                                    'help': 'names of nodes. Multiple names are separated by spaces or commas and quoted as one string, like "node1 node2 node3", and numbered names can be in ranges, like "node[001-100,200]". Either this or the --pattern parameter must be provided.',
                                 }
                             },
                             {
                                 'name': '--pattern',
                                 'options': {
-                                    'help': 'name pattern of nodes. Either this or the --nodes parameter must be provided.',
+                                    'help': 'name patterns of nodes, separated by spaces and quoted as one string, like "node* !node0*". Those starting with "!" exclude nodes. Either this or the --nodes parameter must be provided.',
                                     'default': config.get('DEFAULT', 'pattern', fallback=None)
                                 }
                             },
@@ -106,19 +116,21 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
                             'action': 'store_true'
                         }
                     },
-                ],
+                    {
+                        'name': '--poll-timeout',
+                        'options': {
+                            'help': 'seconds to wait for the job state before giving up. By default, it waits forever.',
+                            'type': float,
+                        }
+                    },
+                ] + cls.progress_params(config) + cls.node_cache_params(config),
             },
             {
                 'name': 'cancel',
                 'options': {
-                    'help': 'cancel a job',
+                    'help': 'cancel jobs',
                 },
-                'params': [
-                    {
-                        'name': 'ids',
-                        'options': { 'help': 'job id', 'metavar': 'id', 'nargs': '+' }
-                    },
-                ],
+                'params': cls.cancel_params(config),
             },
         ]
 
@@ -127,25 +139,26 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
         self.print_tests(tests)
 
     def list(self):
-        jobs = self.api.get_diagnostic_jobs(reverse=not self.args.asc, count=self.args.count, last_id=self.args.last_id)
-        self.print_jobs(jobs)
+        conditions, over = self.job_filters()
+        if self.args.test:
+            match = compile_pattern(self.args.test)
+            conditions.append(lambda j: match(self.test_name(j)))
+        jobs = self.list_objects(self.api.get_diagnostic_jobs, conditions, over, reverse=not self.args.asc)
+        if self.args.output == 'jsonl':
+            self.print_json_lines(jobs)
+        else:
+            self.print_jobs(jobs)
 
     def show(self):
-        job = self.api.get_diagnostic_job(self.args.id)
+        id = self.args.id
+        job = self.get_cached('diagnostic-job', id, 'Job', lambda: self.api.get_diagnostic_job(id), self.is_over)
         if self.args.short:
             self.show_in_short(job)
         else:
             self.show_progressing(job)
 
     def new(self):
-        if self.args.nodes:
-            nodes = self.args.nodes.split()
-        elif self.args.pattern:
-            all = self.api.get_nodes(count=1000000)
-            names = [n.name for n in all]
-            nodes = match_names(names, self.args.pattern)
-        else:
-            raise ValueError('Either nodes or pattern parameter must be provided!')
+        nodes = self.target_nodes()
 
         cat, name = self.args.test.split('-')
         job = {
@@ -162,18 +175,16 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
             self.show_progressing(job)
 
     def cancel(self):
-        for id in self.args.ids:
-            try:
-                self.api.cancel_diagnostic_job(id, job = { "request": "cancel" })
-                print("Job %s is canceled." % id)
-            except ApiException as e:
-                print("Failed to cancel job %s. Error:\n" % id, e)
+        # For "--match", a job is matched by its test
+        self.cancel_jobs(self.api.get_diagnostic_jobs, self.api.cancel_diagnostic_job, self.test_name)
 
     def show_in_short(self, job):
-        self.print_jobs([job])
+        self.print_jobs([job], in_short=False)
         try:
-            result = self.api.get_diagnostic_job_aggregation_result(job.id)
-        except ApiException: # 404 when aggregation result is not ready
+            result = self.get_cached('diagnostic-aggregation-result', job.id, 'object',
+                                     lambda: self.api.get_diagnostic_job_aggregation_result(job.id),
+                                     lambda _: self.is_over(job))
+        except self.ApiException: # 404 when aggregation result is not ready
             pass
         else:
             self.print_agg_result(job, result)
@@ -183,13 +194,22 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
         end_states = ['Finished', 'Failed', 'Canceled']
         if state not in end_states:
             self.print_jobs([job])
-            while not state in end_states:
+
+            def show_progress(_):
                 sys.stdout.write('.')
                 sys.stdout.flush()
-                time.sleep(1)
-                job = self.api.get_diagnostic_job(job.id)
-                state = job.state
-            print('\n')
+
+            if self.args.progress:
+                job = self.watch_progress(job, self.api.get_diagnostic_job, self.api.get_diagnostic_tasks)
+                print('')
+            else:
+                job = self.poller().poll(
+                    lambda: self.api.get_diagnostic_job(job.id),
+                    lambda j: j.state in end_states,
+                    state=lambda j: j.state,
+                    progress=show_progress
+                )
+                print('\n')
         self.show_in_short(job)
 
     def print_tests(self, tests):
@@ -201,21 +221,26 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
             'title': 'Description',
             'value': lambda t: arrange(t.description, 80),
         }
-        print_table([test, description], tests)
+        self.print_table([test, description], tests)
 
-    def print_jobs(self, jobs):
+    def print_jobs(self, jobs, in_short=True):
         target_nodes = {
             'title': 'Target nodes',
-            'value': lambda j: len(j.target_nodes)
+            'value': lambda j: len(j.target_nodes) if in_short else arrange_nodes(j.target_nodes, 40)
         }
         test = {
             'title': 'Test',
-            'value': lambda j: '%s-%s' % (j.diagnostic_test.category, j.diagnostic_test.name)
+            'value': self.test_name
         }
-        print_table(['id', test, 'state', target_nodes, 'created_at'], jobs)
+        self.print_table(['id', test, 'state', target_nodes, 'created_at'], jobs)
+
+    # Name of the test of a job, or of an object of a job from the API server, like "mpi-pingpong"
+    def test_name(self, job):
+        test = get_field(job, 'diagnostic_test')
+        return '%s-%s' % (get_field(test, 'category'), get_field(test, 'name'))
 
     def print_agg_result(self, job, result):
-        if isinstance(result, str) or isinstance(result, unicode):
+        if isinstance(result, str):
             result = json.loads(result)
         if job.diagnostic_test.category == 'mpi' and job.diagnostic_test.name == 'pingpong':
             self.print_mpi_pingpong_result(result)
@@ -228,10 +253,8 @@ For help of a subcommand(tests|list|show|new|cancel), execute "%(prog)s {subcomm
         def get_and_print(field):
             nodes = result.get(field, None)
             if nodes is not None:
-                nodes.sort()
                 print("%s(%d):" % (field, len(nodes)))
-                for n in nodes:
-                    print(n)
+                print(arrange(compress_hostlist(nodes, ' '), 80))
         get_and_print("GoodNodes")
         get_and_print("BadNodes")
 
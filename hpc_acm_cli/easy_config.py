@@ -20,3 +20,10 @@ else:
                 value = fallback
             return int(value)
 
+
+        def getfloat(self, section, option, fallback=None):
+            try:
+                value = ConfigParser.getfloat(self, section, option)
+            except (NoSectionError, NoOptionError):
+                value = fallback
+            return float(value)
@@ -0,0 +1,93 @@
+import re
+
+# Expand a host list like "node[001-003,010] head other[1-2]-ib" to names, one by one.
+# Items are separated by spaces or commas outside brackets. In brackets are numbers and
+# ranges of numbers, which are padded by zeros to the width of the first number of a
+# range, and more than one brackets in an item give all combinations.
+def expand_hostlist(hostlist):
+    for item in split_hostlist(hostlist):
+        parts = re.split(r'\[([^\]]*)\]', item)
+        # Even indexes are literal text, odd ones are range lists in brackets
+        for i in range(1, len(parts), 2):
+            parts[i] = parse_ranges(parts[i], item)
+        for name in expand_parts(parts):
+            yield name
+
+def expand_parts(parts):
+    if len(parts) == 1:
+        yield parts[0]
+        return
+    for number in iter_ranges(parts[1]):
+        for rest in expand_parts(parts[2:]):
+            yield parts[0] + number + rest
+
+item_pattern = re.compile(r'(?:[^\s,\[\]]|\[[^\[\]]*\])+')
+
+def split_hostlist(hostlist):
+    if item_pattern.sub('', hostlist).strip(', \t\n'):
+        raise ValueError('Invalid host list "%s"!' % hostlist)
+    return item_pattern.findall(hostlist)
+
+# Parse ranges like "001-003,010" to a list of (first, last, width)
+def parse_ranges(ranges, item):
+    parsed = []
+    for r in ranges.split(','):
+        m = re.match(r'^\s*(\d+)(?:-(\d+))?\s*$', r)
+        if not m:
+            raise ValueError('Invalid host list "%s"!' % item)
+        first, last = m.group(1), m.group(2) or m.group(1)
+        if int(last) < int(first):
+            raise ValueError('Invalid host list "%s"!' % item)
+        parsed.append((int(first), int(last), len(first)))
+    return parsed
+
+def iter_ranges(ranges):
+    for first, last, width in ranges:
+        for n in range(first, last + 1):
+            yield '%0*d' % (width, n)
+
+# Compress names to a host list, the reverse of expand_hostlist, like "node[001-003,010]".
+# Names are grouped by the text around their last number, and the width of the number if
+# it's padded by zeros. Items are separated by sep.
+def compress_hostlist(names, sep=','):
+    groups = {}
+    others = set()
+    for name in names:
+        m = re.match(r'^(.*?)(\d+)(\D*)$', name)
+        if m:
+            groups.setdefault((m.group(1), m.group(3)), set()).add(m.group(2))
+        else:
+            others.add(name)
+    items = [(name, name) for name in others]
+    for (prefix, suffix), numbers in groups.items():
+        # Numbers padded by zeros, by width, and those not
+        widths = set(len(n) for n in numbers if len(n) > 1 and n.startswith('0'))
+        by_width = {}
+        for n in numbers:
+            width = len(n) if len(n) in widths else 0
+            by_width.setdefault(width, set()).add(int(n))
+        for width, values in by_width.items():
+            ranges = compress_numbers(sorted(values), width)
+            if len(ranges) == 1 and '-' not in ranges[0]:
+                text = '%s%s%s' % (prefix, ranges[0], suffix)
+            else:
+                text = '%s[%s]%s' % (prefix, ','.join(ranges), suffix)
+            items.append(((prefix, suffix, min(values)), text))
+    return sep.join(text for _, text in sorted(items, key=lambda i: sort_key(i[0])))
+
+def compress_numbers(values, width):
+    ranges = []
+    start = prev = values[0]
+    for v in values[1:] + [None]:
+        if v is not None and v == prev + 1:
+            prev = v
+            continue
+        if start == prev:
+            ranges.append('%0*d' % (width, start))
+        else:
+            ranges.append('%0*d-%0*d' % (width, start, width, prev))
+        start = prev = v
+    return ranges
+
+def sort_key(key):
+    return key if isinstance(key, tuple) else (key, '', -1)
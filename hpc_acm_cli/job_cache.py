@@ -0,0 +1,151 @@
+import os
+import time
+import atexit
+import hashlib
+import threading
+
+class JobCache:
+    '''
+    Jobs that are over, and their tasks, task results and output, which don't change
+    any more, saved in a directory readable only by the user, and keyed by the API host,
+    a kind and an id. Entries are saved in a SQLite database, except large ones, which
+    are saved in files of their own. Each change is committed at once, so that other
+    processes can use the cache at the same time. When the total size is over
+    "max_size" bytes, the least recently used entries are removed, every
+    "evict_interval" seconds while it's in use, and at exit. The cache is only for
+    speed, so errors of the database are taken as misses.
+    '''
+
+    # Entries larger than this are saved in files rather than in the database
+    inline_size = 64 * 1024
+
+    # Seconds to wait for the database locked by another process
+    busy_timeout = 5
+
+    # Seconds between evictions while the cache is in use
+    evict_interval = 60
+
+    def __init__(self, path, host, max_size, clock=time.time):
+        self.path = path
+        self.host = host
+        self.max_size = max_size
+        self.clock = clock
+        self.db = None
+        self.evicted_at = None
+        # The cache is shared by commands in threads of "clus daemon"
+        self.lock = threading.RLock()
+
+    def connect(self):
+        if self.db:
+            return self.db
+        import sqlite3
+        # Output could be sensitive, so keep it from others
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        os.makedirs(os.path.join(self.path, 'blobs'), exist_ok=True)
+        db = sqlite3.connect(os.path.join(self.path, 'cache.db'), timeout=self.busy_timeout, check_same_thread=False)
+        try:
+            self.init_db(db)
+        except sqlite3.Error:
+            db.close()
+            raise
+        self.db = db
+        self.evicted_at = self.clock()
+        atexit.register(self.close)
+        return self.db
+
+    def init_db(self, db):
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('''CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, data TEXT, blob TEXT, size INTEGER, used_at REAL)''')
+        db.execute('CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)')
+        db.commit()
+
+    def close(self):
+        import sqlite3
+        with self.lock:
+            if not self.db:
+                return
+            try:
+                self.evict()
+            except sqlite3.Error:
+                pass
+            self.db.close()
+            self.db = None
+
+    def key(self, kind, id):
+        return '%s %s %s' % (self.host, kind, id)
+
+    def blob_path(self, key):
+        return os.path.join(self.path, 'blobs', hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    # Get the text of an entry, or None when it's not cached
+    def get(self, kind, id):
+        import sqlite3
+        try:
+            with self.lock:
+                return self.load(self.connect(), self.key(kind, id))
+        except sqlite3.Error:
+            return None
+
+    def load(self, db, key):
+        row = db.execute('SELECT data, blob FROM entries WHERE key = ?', (key,)).fetchone()
+        if not row:
+            return None
+        data, blob = row
+        if blob:
+            try:
+                with open(blob, 'r') as f:
+                    data = f.read()
+            except (IOError, OSError):
+                with db:
+                    db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+        with db:
+            db.execute('UPDATE entries SET used_at = ? WHERE key = ?', (self.clock(), key))
+        return data
+
+    def put(self, kind, id, data):
+        import sqlite3
+        try:
+            with self.lock:
+                self.store(self.connect(), self.key(kind, id), data)
+                if self.clock() - self.evicted_at >= self.evict_interval:
+                    self.evict()
+        except sqlite3.Error:
+            pass
+
+    def store(self, db, key, data):
+        size = len(data)
+        blob = None
+        if size > self.inline_size:
+            blob = self.blob_path(key)
+            # Write to a temp file and then rename it, so that a concurrent reader never
+            # sees a partial file.
+            temp = '%s.%d.%d' % (blob, os.getpid(), threading.current_thread().ident)
+            with open(temp, 'w') as f:
+                f.write(data)
+            os.replace(temp, blob)
+            data = None
+        with db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', (key, data, blob, size, self.clock()))
+
+    # Remove the least recently used entries until the total size is within max_size
+    def evict(self):
+        self.evicted_at = self.clock()
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_size:
+            return
+        removed = []
+        for key, blob, size in self.db.execute('SELECT key, blob, size FROM entries ORDER BY used_at'):
+            if total <= self.max_size:
+                break
+            removed.append((key,))
+            total -= size
+            if blob:
+                try:
+                    os.remove(blob)
+                except OSError:
+                    pass
+        with self.db:
+            self.db.executemany('DELETE FROM entries WHERE key = ?', removed)
@@ -1,6 +1,6 @@
 from __future__ import print_function
 from hpc_acm_cli.command import Command
-from hpc_acm_cli.utils import print_table, match_names, shorten, arrange
+from hpc_acm_cli.utils import compile_patterns, get_field, shorten, arrange
 
 class Node(Command):
     @classmethod
@@ -33,7 +33,15 @@ For help of a subcommand(list|show), execute "%(prog)s {subcommand} -h"
                         'name': '--last-id',
                         'options': { 'help': 'the node id since which(but not included) to query' }
                     },
-                ],
+                    {
+                        'name': '--pattern',
+                        'options': { 'help': 'name patterns of nodes to query, separated by spaces, like "node* !node0*". Those starting with "!" exclude nodes.' }
+                    },
+                    {
+                        'name': '--state',
+                        'options': { 'help': 'states of nodes to query, separated by commas, like "Online"' }
+                    },
+                ] + cls.paging_params(config),
             },
             {
                 'name': 'show',
@@ -50,8 +58,15 @@ For help of a subcommand(list|show), execute "%(prog)s {subcommand} -h"
         ]
 
     def list(self):
-        nodes = self.api.get_nodes(count=self.args.count, last_id=self.args.last_id)
-        self.print_nodes(nodes, in_short=True)
+        conditions = self.state_conditions()
+        if self.args.pattern:
+            match = compile_patterns(self.args.pattern)
+            conditions.append(lambda n: match(get_field(n, 'name')))
+        nodes = self.list_objects(self.api.get_nodes, conditions)
+        if self.args.output == 'jsonl':
+            self.print_json_lines(nodes)
+        else:
+            self.print_nodes(nodes, in_short=True)
 
     def show(self):
         nodes = [self.api.get_node(self.args.id)]
@@ -75,7 +90,7 @@ For help of a subcommand(list|show), execute "%(prog)s {subcommand} -h"
             'value': lambda n: shorten(n.node_registration_info.distro_info, 60) \
                         if in_short else arrange(n.node_registration_info.distro_info, 60)
         }
-        print_table(['name', 'health', 'state', jobs, cores, memory, os], nodes)
+        self.print_table(['name', 'health', 'state', jobs, cores, memory, os], nodes)
 
 def main():
     Node.run()
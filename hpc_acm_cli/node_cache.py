@@ -0,0 +1,46 @@
+import os
+import json
+import time
+import threading
+
+class NodeCache:
+    '''
+    Names of all nodes of clusters, saved in a file and keyed by the API host. The
+    names are used as they are within "ttl" seconds since they're last refreshed, and
+    all of them are refreshed after that, or when asked to. They're not updated with
+    nodes after the last one cached, since ids of nodes are their names, and a new node
+    could come anywhere in the order.
+    '''
+
+    def __init__(self, path, host, ttl, clock=time.time):
+        self.path = path
+        self.host = host
+        self.ttl = ttl
+        self.clock = clock
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save(self, entry):
+        data = self.load()
+        data[self.host] = entry
+        # Write to a temp file and then rename it, so that a concurrent reader never
+        # sees a partial file.
+        temp = '%s.%d.%d' % (self.path, os.getpid(), threading.current_thread().ident)
+        with open(temp, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp, self.path)
+
+    # Get names of all nodes. iter_nodes() yields all nodes.
+    def names(self, iter_nodes, refresh=False):
+        now = self.clock()
+        entry = self.load().get(self.host)
+        if not refresh and entry and now - entry.get('updated_at', 0) <= self.ttl:
+            return entry['names']
+        entry = {'names': [node.name for node in iter_nodes()], 'updated_at': now}
+        self.save(entry)
+        return entry['names']
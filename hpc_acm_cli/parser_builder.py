@@ -1,17 +1,22 @@
 import argparse
 
 class ParserBuilder:
+    # When argv is given, only the subcommand in it gets its params added, since the
+    # params of other subcommands are not used to parse it, nor to show help.
     @classmethod
-    def build(cls, spec):
+    def build(cls, spec, argv=None):
         parser = argparse.ArgumentParser(**spec.get('options', {}))
         params = spec.get('params', None)
         if params:
             cls.add_params(parser, params);
         subcommands = spec.get('subcommands', None)
         if subcommands:
+            selected = next((a for a in argv if not a.startswith('-')), None) if argv is not None else None
             subparsers = parser.add_subparsers(**subcommands.get('options', {}))
             for cmd in subcommands['items']:
                 subparser = subparsers.add_parser(cmd['name'], **cmd.get('options', {}))
+                if argv is not None and cmd['name'] != selected:
+                    continue
                 params = cmd.get('params', None)
                 if params:
                     cls.add_params(subparser, params);
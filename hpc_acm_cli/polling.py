@@ -0,0 +1,66 @@
+import time
+import random
+
+class PollTimeout(Exception):
+    pass
+
+class Poller:
+    '''
+    Policy of polling a server for something to be over, like the state of a job. The
+    interval between polls starts at "interval" and grows by "factor" each time, up
+    to "max_interval". It's reset to "interval" when the polled state changes, since
+    a change often comes with more. Each interval is randomized by up to "jitter" of
+    it, so that many clients don't poll in step. PollTimeout is raised when it's not
+    over in "timeout" seconds, if timeout is not None.
+    '''
+
+    def __init__(self, interval=0.5, max_interval=10, factor=2, jitter=0.2, timeout=None,
+                 clock=time.time, sleep=time.sleep, random=random.random):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.random = random
+
+    # Call get until over(result) is true, and return the last result. state(result) is
+    # the state to reset the interval on change, and progress(result) is called after
+    # each poll that is not over.
+    def poll(self, get, over, state=None, progress=None):
+        start = self.clock()
+        interval = self.interval
+        last_state = None
+        first = True
+        while True:
+            result = get()
+            if over(result):
+                return result
+            if progress:
+                progress(result)
+            if state:
+                current_state = state(result)
+                if not first and current_state != last_state:
+                    interval = self.interval
+                last_state = current_state
+            first = False
+            delay = self.jittered(interval)
+            if self.timeout is not None:
+                remaining = self.timeout - (self.clock() - start)
+                if remaining <= 0:
+                    raise PollTimeout('Timed out after %s seconds!' % self.timeout)
+                delay = min(delay, remaining)
+            self.sleep(delay)
+            interval = min(interval * self.factor, self.max_interval)
+
+    def jittered(self, interval):
+        return interval * (1 + self.jitter * (2 * self.random() - 1))
+
+    # Delays between polls, by the policy, for a poll that is not blocking, like that of
+    # an AsyncOp, which calls again after each delay
+    def delays(self):
+        interval = self.interval
+        while True:
+            yield self.jittered(interval)
+            interval = min(interval * self.factor, self.max_interval)
@@ -0,0 +1,73 @@
+from __future__ import print_function
+import sys
+import time
+import datetime
+
+class Progress:
+    '''
+    A line of counts of tasks of a job by state, with the throughput of tasks getting
+    over, in tasks per second since the first update, and the ETA of all tasks by it.
+    On a terminal, the line is redrawn in place, and otherwise a line is printed for
+    each redraw. Updates are drawn at most once in "interval" seconds, except the last.
+    '''
+
+    states = ['Queued', 'Dispatching', 'Running', 'Finished', 'Failed', 'Canceled']
+    end_states = ['Finished', 'Failed', 'Canceled']
+
+    def __init__(self, total, interval=1, file=None, clock=time.time):
+        self.total = total
+        self.interval = interval
+        self.file = file or sys.stderr
+        self.clock = clock
+        self.start = None
+        self.start_over = 0
+        self.last_draw = None
+        self.last_width = 0
+
+    # Count tasks by state from a snapshot of them
+    @staticmethod
+    def count(tasks):
+        counts = {}
+        for task in tasks:
+            counts[task.state] = counts.get(task.state, 0) + 1
+        return counts
+
+    def update(self, counts, last=False):
+        now = self.clock()
+        over = sum(counts.get(s, 0) for s in self.end_states)
+        if self.start is None:
+            self.start = now
+            self.start_over = over
+        if not last and self.last_draw is not None and now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+        self.draw(self.format(counts, over, now), last)
+
+    def close(self, counts):
+        self.update(counts, last=True)
+
+    def format(self, counts, over, now):
+        parts = ['%s %d' % (s, counts.get(s, 0)) for s in self.states]
+        # States not known, if any
+        parts += ['%s %d' % (s, n) for s, n in sorted(counts.items()) if s not in self.states]
+        created = sum(counts.values())
+        if created < self.total:
+            parts.append('Not created %d' % (self.total - created))
+        elapsed = now - self.start
+        rate = (over - self.start_over) / elapsed if elapsed > 0 else 0
+        if over >= self.total:
+            eta = '0:00:00'
+        elif rate > 0:
+            eta = str(datetime.timedelta(seconds=int((self.total - over) / rate)))
+        else:
+            eta = '?'
+        return '%s | %d/%d over, %.1f tasks/s, ETA %s' % (', '.join(parts), over, self.total, rate, eta)
+
+    def draw(self, line, last):
+        if self.file.isatty():
+            # Pad with spaces to cover the longer line drawn before
+            self.file.write('\r' + line.ljust(self.last_width) + ('\n' if last else ''))
+            self.last_width = len(line)
+        else:
+            self.file.write(line + '\n')
+        self.file.flush()
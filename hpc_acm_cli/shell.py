@@ -0,0 +1,124 @@
+from __future__ import print_function
+import sys
+import shlex
+import argparse
+from hpc_acm_cli.command import Command
+from hpc_acm_cli.node import Node
+from hpc_acm_cli.clus import Clusrun
+from hpc_acm_cli.diag import Diagnostics
+
+# Commands in a shell or a batch file, by names of them and their short names
+commands = {
+    'clusnode': Node,
+    'clusrun': Clusrun,
+    'clusdiag': Diagnostics,
+    'node': Node,
+    'run': Clusrun,
+    'diag': Diagnostics,
+}
+
+# Names of commands by their classes
+names = dict((cls.__name__, name) for name, cls in commands.items() if name.startswith('clus'))
+
+class Shell:
+    '''
+    Run clusnode, clusrun and clusdiag commands one after another in a process, either
+    typed in interactively, or read from a batch file. Commands share API clients, with
+    their connections and access tokens, and the job cache, rather than create them
+    each time.
+    '''
+
+    prompt = 'clus> '
+
+    def __init__(self):
+        Command.shared = {}
+
+    # Run a command line, and return the exit code, or None for success
+    def execute(self, line):
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            print('Error: %s' % e)
+            return 1
+        if not argv:
+            return None
+        return self.dispatch(argv)
+
+    # Run a command by argv, the command line with the command name
+    def dispatch(self, argv):
+        name = argv[0]
+        if name not in commands:
+            print('Error: unknown command "%s". Commands are: %s' % (name, ', '.join(sorted(commands))))
+            return 1
+        try:
+            return commands[name].execute(argv[1:], prog=name)
+        except SystemExit as e:
+            # By argparse for help or bad arguments
+            return e.code
+        except KeyboardInterrupt:
+            print('')
+            return 100
+        except Exception as e:
+            print('Error: %s' % e)
+            return 2
+
+    def interact(self):
+        try:
+            # For line editing and history, where it's available
+            import readline
+        except ImportError:
+            pass
+        print('Type commands like "clusnode list", or "node list" for short. Type "exit" or Ctrl-D to exit.')
+        while True:
+            try:
+                line = input(self.prompt)
+            except EOFError:
+                print('')
+                break
+            except KeyboardInterrupt:
+                print('')
+                continue
+            if line.strip() in ('exit', 'quit'):
+                break
+            self.execute(line)
+
+    # Run commands in lines of a file, and return the exit code of the first failed one,
+    # or of the last failed one with keep_going
+    def batch(self, file, keep_going=False):
+        failure = None
+        for number, line in enumerate(file, 1):
+            code = self.execute(line)
+            if code:
+                print('Error: line %d failed with exit code %s' % (number, code), file=sys.stderr)
+                failure = code
+                if not keep_going:
+                    break
+        return failure
+
+def main():
+    parser = argparse.ArgumentParser(prog='clus', description='Run clusnode, clusrun and clusdiag commands in one process')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('shell', help='run commands typed in interactively')
+    batch = subparsers.add_parser('batch', help='run commands in lines of a file')
+    batch.add_argument('file', nargs='?', help='the file of commands, or stdin if not given', type=argparse.FileType('r'), default=sys.stdin)
+    batch.add_argument('--keep-going', help='run all commands rather than stop at the first failed one', action='store_true')
+    daemon = subparsers.add_parser('daemon', help='serve commands of clusnode, clusrun and clusdiag from a local socket, so that they share API clients and caches')
+    daemon.add_argument('--stop', help='stop the daemon running', action='store_true')
+    args = parser.parse_args()
+    if args.command == 'shell':
+        Shell().interact()
+    elif args.command == 'daemon':
+        from hpc_acm_cli.daemon import serve, stop
+        if args.stop:
+            stop(Command.daemon_socket_path)
+        else:
+            serve(Command.daemon_socket_path, Shell())
+    elif args.command == 'batch':
+        code = Shell().batch(args.file, args.keep_going)
+        if code:
+            sys.exit(code)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
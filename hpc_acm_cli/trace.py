@@ -0,0 +1,232 @@
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+class Tracer:
+    '''
+    Recorder of spans of time of a command, like calls to the API, which are of the
+    "api" category and named by the DefaultApi methods, and phases of the command, like
+    waiting for tasks or loading task output. A span has args, like the status and the
+    size of the response of an API call. The spans are summarized for the "--stats"
+    parameter, and saved in the Chrome trace format, which can be viewed by
+    chrome://tracing or https://ui.perfetto.dev, for the "--trace" parameter.
+    '''
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.start = clock()
+        # Tuples of (category, name, thread id, start, end, args)
+        self.spans = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        # The args of the API call in progress in a thread, for the request hook
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, category, name, **args):
+        start = self.clock()
+        try:
+            yield args
+        except BaseException as e:
+            args.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            self.add(category, name, start, self.clock(), args)
+
+    def add(self, category, name, start, end, args):
+        thread = threading.current_thread()
+        with self.lock:
+            self.spans.append((category, name, thread.ident, start, end, args))
+            self.thread_names[thread.ident] = thread.name
+
+    def save(self, path):
+        pid = os.getpid()
+        events = [{
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': tid,
+            'args': { 'name': name },
+        } for tid, name in self.thread_names.items()]
+        for category, name, tid, start, end, args in self.spans:
+            events.append({
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': int((start - self.start) * 1e6),
+                'dur': int((end - start) * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            })
+        with open(path, 'w') as f:
+            json.dump({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, f)
+
+    # Print a summary of phases, by their total time, and of API calls by endpoint, with
+    # counts, errors, retries, bytes received and latency percentiles.
+    def print_stats(self, file=None):
+        file = file or sys.stderr
+        phases = {}
+        endpoints = {}
+        for category, name, _, start, end, args in self.spans:
+            if category == 'api':
+                endpoints.setdefault(name, []).append((end - start, args))
+            else:
+                phases.setdefault((category, name), []).append(end - start)
+
+        print('%-32s %8s %10s' % ('Phase', 'Count', 'Total(s)'), file=file)
+        for (category, name), durations in sorted(phases.items(), key=lambda p: -sum(p[1])):
+            print('%-32s %8d %10.3f' % (shorten(name, 32), len(durations), sum(durations)), file=file)
+        print('', file=file)
+        print('%-32s %8s %6s %7s %10s %8s %8s %8s %10s' % (
+            'Endpoint', 'Count', 'Errors', 'Retries', 'Bytes', 'p50(ms)', 'p95(ms)', 'p99(ms)', 'Total(s)'), file=file)
+        for name, calls in sorted(endpoints.items()):
+            latencies = sorted(d for d, _ in calls)
+            print('%-32s %8d %6d %7d %10d %8.1f %8.1f %8.1f %10.3f' % (
+                shorten(name, 32),
+                len(calls),
+                sum(1 for _, a in calls if 'error' in a),
+                sum(a.get('retries', 0) for _, a in calls),
+                sum(a.get('bytes') or 0 for _, a in calls),
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000,
+                sum(latencies)), file=file)
+        print('', file=file)
+        print('Total wall time: %.3fs' % (self.clock() - self.start), file=file)
+
+def shorten(name, width):
+    return name if len(name) <= width else name[:width - 3] + '...'
+
+# The p-th percentile of sorted values by the nearest rank, or 0 for no values
+def percentile(values, p):
+    if not values:
+        return 0
+    rank = -(-len(values) * p // 100)
+    return values[min(max(rank, 1), len(values)) - 1]
+
+# The tracer of the command running in the current thread, or None when it's not traced.
+# It's per thread, since commands run in threads of "clus daemon" at the same time, and
+# it's passed to threads making calls for a command by bind.
+local = threading.local()
+
+def current():
+    return getattr(local, 'tracer', None)
+
+class NoSpan:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+no_span = NoSpan()
+
+# A span by the tracer of the command running, if any, as a context manager yielding
+# the args of the span, to which more can be added
+def span(category, name, **args):
+    return span_of(current(), category, name, **args)
+
+def span_of(tracer, category, name, **args):
+    if tracer is None:
+        return no_span
+    return tracer.span(category, name, **args)
+
+# Make func run with the tracer of the command running, if any, in whatever thread it's
+# called, like that of a scheduler. The tracer is the "tracer" attribute of the result.
+def bind(func):
+    tracer = current()
+    if tracer is None:
+        return func
+
+    @functools.wraps(func)
+    def bound(*args, **kwargs):
+        previous = current()
+        local.tracer = tracer
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.tracer = previous
+    bound.tracer = tracer
+    return bound
+
+# Trace a command by the "--stats" and "--trace" parameters, and then print the summary,
+# or save the trace to the file.
+@contextmanager
+def tracing(stats=False, path=None):
+    if not (stats or path):
+        yield
+        return
+    tracer = Tracer()
+    previous = current()
+    local.tracer = tracer
+    try:
+        yield
+    finally:
+        local.tracer = previous
+        if stats:
+            tracer.print_stats()
+        if path:
+            tracer.save(path)
+
+# Make calls to methods of a DefaultApi object spans of the "api" category when traced,
+# with the status, the size and the number of retries of the response. The methods keep
+# their names, by which calls are scheduled.
+def instrument(api):
+    api_client = api.api_client
+    request = api_client.request
+
+    @functools.wraps(request)
+    def traced_request(*args, **kwargs):
+        tracer = current()
+        call = getattr(tracer.local, 'call', None) if tracer else None
+        if call is None:
+            return request(*args, **kwargs)
+        try:
+            resp = request(*args, **kwargs)
+        except Exception as e:
+            add_response(call, getattr(e, 'http_resp', None))
+            raise
+        add_response(call, resp)
+        return resp
+
+    api_client.request = traced_request
+    for name in dir(type(api)):
+        if not name.startswith('_') and not name.endswith('_with_http_info') and callable(getattr(api, name)):
+            setattr(api, name, traced_method(getattr(api, name)))
+    return api
+
+def traced_method(method):
+    @functools.wraps(method)
+    def traced(*args, **kwargs):
+        tracer = current()
+        if tracer is None:
+            return method(*args, **kwargs)
+        with tracer.span('api', method.__name__) as call:
+            tracer.local.call = call
+            try:
+                return method(*args, **kwargs)
+            finally:
+                tracer.local.call = None
+    return traced
+
+# Add the status, size and retries of a response, a RESTResponse, or a urllib3 response
+# for a call with "_preload_content=False", to the args of an API call.
+def add_response(call, resp):
+    if resp is None:
+        return
+    call['status'] = resp.status
+    raw = getattr(resp, 'urllib3_response', resp)
+    if raw is not resp:
+        # Content is loaded already
+        call['bytes'] = len(raw.data or b'')
+    else:
+        length = raw.getheader('Content-Length')
+        call['bytes'] = int(length) if length and length.isdigit() else None
+    retries = getattr(raw, 'retries', None)
+    call['retries'] = len(retries.history) if retries is not None else 0
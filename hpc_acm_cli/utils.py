@@ -1,30 +1,210 @@
+import os
+import re
+import sys
+import csv
+import json
 import fnmatch
-from terminaltables import AsciiTable
+import datetime
+from itertools import islice, chain
+from collections import OrderedDict
+from hpc_acm_cli.hostlist import compress_hostlist
+from hpc_acm_cli.trace import bind
+
+# Compile a glob pattern to a function testing whether a name matches it, like fnmatch.fnmatch
+def compile_pattern(pattern):
+    match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    return lambda name: match(os.path.normcase(name)) is not None
+
+# Compile glob patterns separated by spaces to a function testing whether a name matches
+# any of them and none of those starting with "!", which exclude names. When all are to
+# exclude, all other names match.
+def compile_patterns(patterns):
+    includes = []
+    excludes = []
+    for pattern in patterns.split():
+        if pattern.startswith('!'):
+            excludes.append(compile_pattern(pattern[1:]))
+        else:
+            includes.append(compile_pattern(pattern))
+    return lambda name: (not includes or any(m(name) for m in includes)) and not any(m(name) for m in excludes)
 
 def match_names(names, pattern):
-    return [n for n in names if fnmatch.fnmatch(n, pattern)]
+    match = compile_pattern(pattern)
+    return [n for n in names if match(n)]
+
+# Yield ids in values, each of which is an id like "12", a range of ids like "10-20", or
+# "-" for ids separated by whitespaces from stdin
+def parse_ids(values, stdin=None):
+    for value in values:
+        if value == '-':
+            for id in parse_ids((stdin or sys.stdin).read().split()):
+                yield id
+            continue
+        m = re.match(r'^(\d+)(?:-(\d+))?$', value)
+        if not m:
+            raise ValueError('Invalid job id "%s"!' % value)
+        first = int(m.group(1))
+        last = int(m.group(2)) if m.group(2) else first
+        for id in range(first, last + 1):
+            yield id
+
+# Parse a time like "2018-10-18", "2018-10-18 10:30" (local time, unless with a time
+# zone), or one ago from now like "30m", "12h" or "7d", to a datetime with time zone
+def parse_time(value):
+    m = re.match(r'^(\d+(?:\.\d+)?)([smhd])$', value.strip())
+    if m:
+        seconds = float(m.group(1)) * { 's': 1, 'm': 60, 'h': 3600, 'd': 86400 }[m.group(2)]
+        return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=seconds)
+    from dateutil import parser, tz
+    try:
+        time = parser.parse(value)
+    except (ValueError, OverflowError):
+        raise ValueError('Invalid time "%s"!' % value)
+    # NOTE: astimezone() of a naive datetime, for local time, requires Python 3.6.
+    return time if time.tzinfo else time.replace(tzinfo=tz.tzlocal())
+
+# A datetime of a model, or a string of it from the API server, to a datetime with time zone
+def to_time(value):
+    if isinstance(value, str):
+        from dateutil import parser
+        value = parser.parse(value)
+    return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+# Value of a field of a model, or of an object as it's sent by the API server, whose keys
+# are in camel case
+def get_field(obj, name):
+    if isinstance(obj, dict):
+        words = name.split('_')
+        return obj.get(words[0] + ''.join(w.capitalize() for w in words[1:]))
+    return getattr(obj, name)
+
+# Elements of pages of get_page(count, last_id), following the id of the last element
+# of a page, until an empty page, or "limit" elements. With prefetch, the next page is
+# requested in a background thread while the elements of the current one are consumed.
+def iter_pages(get_page, count, last_id=None, get_id=lambda e: e.id, limit=None, prefetch=False):
+    def fetch(last_id, size):
+        return get_page(count=size, last_id=last_id) if last_id is not None else get_page(count=size)
+
+    def page_size(remaining):
+        return count if remaining is None else min(count, remaining)
+
+    executor = None
+    if prefetch:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(1)
+    try:
+        remaining = limit
+        size = page_size(remaining)
+        page = fetch(last_id, size) if size > 0 else None
+        while page:
+            if remaining is not None:
+                page = page[:remaining]
+                remaining -= len(page)
+            last_id = get_id(page[-1])
+            size = page_size(remaining)
+            next_page = executor.submit(bind(fetch), last_id, size) if executor and size > 0 else None
+            for e in page:
+                yield e
+            if size <= 0:
+                break
+            page = next_page.result() if next_page else fetch(last_id, size)
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
 
 def titlize(str):
     return ' '.join(str.split('_')).capitalize()
 
-def print_table(fields, collection):
-    def title(f):
-        return titlize(f) if isinstance(f, str) else f['title']
+def field_title(f):
+    return titlize(f) if isinstance(f, str) else f['title']
 
-    def value(element, f):
-        if isinstance(f, str):
-            val = element[f] if isinstance(element, dict) else getattr(element, f)
-        else:
-            val = f['value'](element)
-        return val
+def field_value(element, f):
+    if isinstance(f, str):
+        val = element[f] if isinstance(element, dict) else getattr(element, f)
+    else:
+        val = f['value'](element)
+    return val
+
+# Print elements of collection as they come, in a format of "table", "jsonl", "csv" or
+# "tsv". Fields are those of print_table. For "jsonl", serialize(element) gives the
+# JSON object of an element, or None for an object of the fields.
+def print_records(fields, collection, format='table', serialize=None):
+    if format == 'table':
+        print_table(fields, collection)
+    elif format == 'jsonl':
+        for e in collection:
+            obj = serialize(e) if serialize else None
+            if obj is None:
+                obj = OrderedDict((f if isinstance(f, str) else f['title'], field_value(e, f)) for f in fields)
+            print_json_line(obj)
+    elif format in ('csv', 'tsv'):
+        writer = csv.writer(sys.stdout, delimiter=(',' if format == 'csv' else '\t'), lineterminator='\n')
+        writer.writerow([field_title(f) for f in fields])
+        for e in collection:
+            writer.writerow([field_value(e, f) for f in fields])
+    else:
+        raise ValueError('Unknown output format "%s"!' % format)
+
+def print_json_line(obj):
+    sys.stdout.write(json.dumps(obj, default=str) + '\n')
+
+# Number of rows to compute column widths from, before any row is printed
+table_sample_size = 1000
+
+# Print elements of collection in a table, row by row as they come, in the same style
+# as terminaltables.AsciiTable. A field is either a name of the element's attribute or
+# key, or a dict with "title" and "value" function, and optionally "width", which
+# fixes the column width and shortens longer values. Other columns are as wide as the
+# widest value in the first "sample_size" rows, and grow for wider values after that.
+def print_table(fields, collection, sample_size=None):
+    title = field_title
+    value = field_value
+
+    # A row is a list of cells, each of which is a list of lines
+    def to_cells(values):
+        cells = []
+        for val, width in zip(values, fixed_widths):
+            lines = ('%s' % (val,)).split('\n')
+            if width:
+                lines = [shorten(l, width) for l in lines]
+            cells.append(lines)
+        return cells
 
     def to_row(element):
-        return [value(element, f) for f in fields]
+        return to_cells([value(element, f) for f in fields])
+
+    def border():
+        return '+' + '+'.join(['-' * (w + 2) for w in widths]) + '+'
 
-    headers = [title(f) for f in fields]
-    rows = [to_row(e) for e in collection]
-    table = AsciiTable([headers] + rows)
-    print(table.table)
+    def print_row(cells):
+        for i, lines in enumerate(cells):
+            for l in lines:
+                if len(l) > widths[i]:
+                    widths[i] = len(l)
+        height = max(len(lines) for lines in cells)
+        for n in range(height):
+            line = '|'.join([' %s ' % (lines[n] if n < len(lines) else '').ljust(w) for lines, w in zip(cells, widths)])
+            print('|' + line + '|')
+
+    fixed_widths = [f.get('width') if isinstance(f, dict) else None for f in fields]
+    headers = to_cells([title(f) for f in fields])
+    rows = (to_row(e) for e in collection)
+    sample = [] if all(fixed_widths) else list(islice(rows, sample_size or table_sample_size))
+    widths = [0 for f in fields]
+    for row in [headers] + sample:
+        for i, lines in enumerate(row):
+            widths[i] = max([widths[i]] + [len(l) for l in lines])
+    print(border())
+    print_row(headers)
+    # The border under headers is printed along with the first row, like AsciiTable
+    # prints only one border under headers for an empty table.
+    empty = True
+    for row in chain(sample, rows):
+        if empty:
+            print(border())
+            empty = False
+        print_row(row)
+    print(border())
 
 def shorten(string, limit):
     if len(string) <= limit:
@@ -33,6 +213,10 @@ def shorten(string, limit):
         trail = ' ...'
         return string[0:(limit - len(trail))] + trail
 
+# Number and names of nodes in a host list arranged in lines of width, for a table
+def arrange_nodes(names, width):
+    return '%d\n%s' % (len(names), arrange(compress_hostlist(names, ' '), width))
+
 def arrange(text, width):
     words = list(reversed(text.split()))
     lines = []
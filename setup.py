@@ -1,7 +1,7 @@
 import setuptools
 import os.path
 
-requires = ["hpc-acm >= 1.3.0", "terminaltables >= 3.1.0", "tqdm >= 4.24.0", "adal >= 1.2.0"]
+requires = ["hpc-acm >= 1.3.0", "tqdm >= 4.24.0", "adal >= 1.2.0"]
 
 with open("README.md", "r") as fh:
     long_description = fh.read()
@@ -30,6 +30,7 @@ setuptools.setup(
             'clusnode=hpc_acm_cli.node:main',
             'clusrun=hpc_acm_cli.clus:main',
             'clusdiag=hpc_acm_cli.diag:main',
+            'clus=hpc_acm_cli.shell:main',
         ],
     },
     # NOTE: DO NOT rely on "data_files" since it's very buggy and confusing. See the
@@ -38,5 +39,8 @@ setuptools.setup(
     package_data={
         'hpc_acm_cli': ['.hpc_acm_cli_config', '3rdpartylicenses.txt']
     },
-    install_requires=requires
+    install_requires=requires,
+    extras_require={
+        'asyncio': ['aiohttp >= 3.0'],
+    }
 )
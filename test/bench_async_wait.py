@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# Benchmark of async_op.async_wait on synthetic ops, without an ACM server.
+#
+# Usage: python test/bench_async_wait.py [number-of-ops]
+#
+# It reports the wall time and the CPU time of the waiting thread, for the
+# event-driven async_wait and for the busy-poll loop it replaced.
+
+from __future__ import print_function
+import sys
+import time
+import random
+from hpc_acm_cli.async_op import AsyncOp, Scheduler, async_wait
+
+class FakeApi:
+    def get(self, delay):
+        time.sleep(delay)
+        return delay
+
+class SyntheticOp(AsyncOp):
+    def __init__(self, api, scheduler, delay):
+        self.api = api
+        self.scheduler = scheduler
+        self.async_result = self.call(api.get, delay)
+
+    def get_result(self):
+        if not self.async_result.ready():
+            raise AsyncOp.NotReady()
+        return self.async_result.get()
+
+# The busy-poll loop of async_wait before it's event-driven
+def poll_wait(ops):
+    total = len(ops)
+    done = [False for i in range(total)]
+    done_count = 0
+    while done_count != total:
+        yielded = False
+        for idx, op in enumerate(ops):
+            if done[idx]:
+                continue
+            try:
+                op.get_result()
+            except AsyncOp.NotReady:
+                pass
+            else:
+                yielded = True
+                done[idx] = True
+                done_count += 1
+        if not yielded:
+            time.sleep(0.1)
+
+def thread_time():
+    # CPU time of the calling thread only, excluding that of the worker threads
+    return time.thread_time() if hasattr(time, 'thread_time') else time.clock()
+
+def bench(name, wait, count):
+    api = FakeApi()
+    scheduler = Scheduler(32)
+    random.seed(0)
+    ops = [SyntheticOp(api, scheduler, random.uniform(0, 0.002)) for i in range(count)]
+    wall = time.time()
+    cpu = thread_time()
+    wait(ops)
+    cpu = thread_time() - cpu
+    wall = time.time() - wall
+    print('%-12s ops: %d, wall: %.3fs, cpu: %.3fs, cpu per op: %.1fus' % (name, count, wall, cpu, cpu * 1e6 / count))
+    scheduler.pool.close()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    bench('event-driven', lambda ops: async_wait(ops, desc='Waiting'), count)
+    bench('busy-poll', poll_wait, count)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#
+# End-to-end benchmark of commands against the stand-in ACM server in mock_server.py,
+# at several cluster sizes.
+#
+# Usage: python test/bench_e2e.py [--sizes 1000,10000,50000] [--task-time SECONDS]
+#            [--output-size BYTES] [--latency SECONDS] [--save FILE]
+#            [--baseline FILE] [--tolerance RATE] [-- extra CLI parameters]
+#
+# For each size, a server is started with that many nodes, and each command is run
+# in a new process, with a temporary home directory, so that caches are empty at
+# first. It reports the wall time, CPU time and peak RSS of the command process, and
+# the number of requests by "--stats". Results can be saved to a file in JSON Lines,
+# and compared with those saved before, by "--baseline", when it exits with 1 if a
+# command is slower by more than "--tolerance" of its wall time.
+
+from __future__ import print_function
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import argparse
+import subprocess
+
+dir = os.path.dirname(os.path.abspath(__file__))
+
+# Names and command lines. Jobs are numbered from 1 by a new server.
+commands = [
+    ('clusnode list', ['hpc_acm_cli.node', 'list', '--all']),
+    ('clusrun new', ['hpc_acm_cli.clus', 'new', '--pattern', '*', 'hostname']),
+    ('clusrun show', ['hpc_acm_cli.clus', 'show', '1']),
+    ('clusrun show (cached)', ['hpc_acm_cli.clus', 'show', '1']),
+    ('clusrun show --short', ['hpc_acm_cli.clus', 'show', '1', '--short', '--no-job-cache']),
+    ('clusdiag new', ['hpc_acm_cli.diag', 'new', 'mpi-pingpong', '--pattern', '*']),
+    ('clusdiag show', ['hpc_acm_cli.diag', 'show', '1']),
+]
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def start_server(port, args, nodes):
+    server = subprocess.Popen([
+        sys.executable, os.path.join(dir, 'mock_server.py'),
+        '--port', str(port),
+        '--nodes', str(nodes),
+        '--task-time', str(args.task_time),
+        '--latency', str(args.latency),
+    ] + (['--output-size', str(args.output_size)] if args.output_size else []), stdout=subprocess.DEVNULL)
+    # Wait for it to listen
+    for _ in range(100):
+        try:
+            socket.create_connection(('localhost', port)).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('The server is not started')
+
+# Number of requests from the "--stats" summary in stderr
+def request_count(stderr):
+    lines = stderr.splitlines()
+    try:
+        start = next(i for i, l in enumerate(lines) if l.startswith('Endpoint '))
+    except StopIteration:
+        return None
+    count = 0
+    for line in lines[start + 1:]:
+        m = re.match(r'^\S+\s+(\d+)\s', line)
+        if not m:
+            break
+        count += int(m.group(1))
+    return count
+
+# The exit code of a wait status, or the negative signal number for a signal, as
+# os.waitstatus_to_exitcode of Python 3.9, on Pythons the CLI runs on
+def exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+# Run a command, and return its exit code, wall time, CPU time, peak RSS in MB and
+# number of requests
+def run(command, host, home, extra):
+    env = dict(os.environ, HOME=home, PYTHONPATH=os.pathsep.join([os.path.dirname(dir)] + sys.path))
+    with tempfile.TemporaryFile() as stderr:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, '-m'] + command + ['--host', host, '--stats'] + extra,
+                                   stdout=subprocess.DEVNULL, stderr=stderr, env=env)
+        # The resource usage of the process alone, rather than of all children
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.time() - start
+        process.returncode = exit_code(status)
+        stderr.seek(0)
+        requests = request_count(stderr.read().decode('utf-8', 'replace'))
+    # ru_maxrss is in KB on Linux, and in bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return process.returncode, wall, usage.ru_utime + usage.ru_stime, rss, requests
+
+def load(path):
+    results = {}
+    with open(path) as f:
+        for line in f:
+            r = json.loads(line)
+            results[(r['nodes'], r['command'])] = r
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of commands against mock_server.py')
+    parser.add_argument('--sizes', default='1000,10000,50000', help='numbers of nodes, separated by commas')
+    parser.add_argument('--task-time', type=float, default=1, help='seconds for a task to finish')
+    parser.add_argument('--output-size', type=int, help='characters of output of each task')
+    parser.add_argument('--latency', type=float, default=0, help='seconds for the server to answer a request')
+    parser.add_argument('--save', help='file to append results to, in JSON Lines')
+    parser.add_argument('--baseline', help='file of results saved before, to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='rate of wall time over the baseline to fail')
+    parser.add_argument('extra', nargs='*', help='parameters for each command, after "--", like "--engine asyncio"')
+    args = parser.parse_args()
+
+    baseline = load(args.baseline) if args.baseline else {}
+    regressions = []
+    print('%8s %-24s %5s %9s %9s %9s %9s %9s' % ('Nodes', 'Command', 'Exit', 'Wall(s)', 'CPU(s)', 'RSS(MB)', 'Requests', 'Baseline'))
+    for nodes in [int(s) for s in args.sizes.split(',')]:
+        port = free_port()
+        home = tempfile.mkdtemp()
+        server = start_server(port, args, nodes)
+        try:
+            for name, command in commands:
+                code, wall, cpu, rss, requests = run(command, 'http://localhost:%d/v1' % port, home, args.extra)
+                result = {
+                    'nodes': nodes,
+                    'command': name,
+                    'exit_code': code,
+                    'wall': round(wall, 3),
+                    'cpu': round(cpu, 3),
+                    'rss': round(rss, 1),
+                    'requests': requests,
+                }
+                base = baseline.get((nodes, name))
+                change = ''
+                if base:
+                    change = '%+.0f%%' % ((wall / base['wall'] - 1) * 100)
+                    if wall > base['wall'] * (1 + args.tolerance):
+                        regressions.append(result)
+                print('%8d %-24s %5d %9.3f %9.3f %9.1f %9s %9s' % (
+                    nodes, name, code, wall, cpu, rss, requests if requests is not None else '-', change))
+                sys.stdout.flush()
+                if args.save:
+                    with open(args.save, 'a') as f:
+                        f.write(json.dumps(result) + '\n')
+        finally:
+            server.kill()
+            server.wait()
+            shutil.rmtree(home, ignore_errors=True)
+    if regressions:
+        print('Slower than the baseline by more than %d%%: %s' % (
+            args.tolerance * 100, ', '.join('%s at %d nodes' % (r['command'], r['nodes']) for r in regressions)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
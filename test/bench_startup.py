@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+#
+# Benchmark of startup time of the entry points, for commands that don't reach
+# the API server.
+#
+# Usage: python test/bench_startup.py [number-of-runs]
+#
+# For each command, it reports the best wall time of the runs, and the modules
+# taking the most cumulative import time by "python -X importtime".
+
+from __future__ import print_function
+import os
+import re
+import sys
+import time
+import subprocess
+
+commands = [
+    ['hpc_acm_cli.node', '-h'],
+    ['hpc_acm_cli.clus', '-h'],
+    ['hpc_acm_cli.clus', 'new', '-h'],
+    ['hpc_acm_cli.diag', '-h'],
+    ['hpc_acm_cli.diag', 'new', '-h'],
+]
+
+def run(args, options=[]):
+    start = time.time()
+    process = subprocess.Popen([sys.executable] + options + ['-m'] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = process.communicate()
+    return time.time() - start, err.decode('utf-8', 'replace')
+
+# Top modules by cumulative import time, in microseconds
+def top_imports(args, count):
+    _, err = run(args, ['-X', 'importtime'])
+    imports = []
+    for line in err.splitlines():
+        m = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|(\s+)(\S+)', line)
+        # Only the top level ones, whose time includes those of their imports
+        if m and len(m.group(2)) == 1:
+            imports.append((int(m.group(1)), m.group(3)))
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    env_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['PYTHONPATH'] = os.pathsep.join([env_path, os.environ.get('PYTHONPATH', '')])
+    for args in commands:
+        best = min(run(args)[0] for i in range(runs))
+        print('%-32s %.1fms' % (' '.join(args), best * 1000))
+        for us, name in top_imports(args, 5):
+            print('    %-28s %.1fms' % (name, us / 1000.0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#
+# Benchmark of utils.print_table against terminaltables.AsciiTable, which it
+# replaced, for rows like those of "clusnode list".
+#
+# Usage: python test/bench_table.py [number-of-rows]
+#
+# It reports the time to the first row printed, the total time and the peak
+# memory allocated by Python for each.
+
+from __future__ import print_function
+import os
+import sys
+import time
+import tracemalloc
+from hpc_acm_cli.utils import print_table, shorten
+
+class Node:
+    def __init__(self, i):
+        self.name = 'node%06d' % i
+        self.health = 'OK'
+        self.state = 'Online'
+        self.running_job_count = i % 3
+        self.distro_info = 'Linux 4.15.0-1036-azure #38-Ubuntu SMP Fri Dec 14 %d x86_64 GNU/Linux' % i
+
+fields = [
+    'name',
+    'health',
+    'state',
+    { 'title': 'Running Jobs', 'value': lambda n: n.running_job_count },
+    { 'title': 'OS', 'value': lambda n: shorten(n.distro_info, 60) },
+]
+
+def nodes(count):
+    for i in range(count):
+        yield Node(i)
+
+def ascii_table(fields, collection):
+    from terminaltables import AsciiTable
+    from hpc_acm_cli.utils import titlize
+
+    def title(f):
+        return titlize(f) if isinstance(f, str) else f['title']
+
+    def value(element, f):
+        return getattr(element, f) if isinstance(f, str) else f['value'](element)
+
+    rows = [[value(e, f) for f in fields] for e in collection]
+    print(AsciiTable([[title(f) for f in fields]] + rows).table)
+
+class Output:
+    # Stdout recording the time of the first write after headers
+    def __init__(self, file):
+        self.file = file
+        self.lines = 0
+        self.first_row = None
+
+    def write(self, s):
+        self.lines += s.count('\n')
+        if self.first_row is None and self.lines > 3:
+            self.first_row = time.time()
+        self.file.write(s)
+
+    def flush(self):
+        self.file.flush()
+
+def bench(name, print_func, count):
+    stdout = sys.stdout
+    sys.stdout = output = Output(open(os.devnull, 'w'))
+    tracemalloc.start()
+    start = time.time()
+    try:
+        print_func(fields, nodes(count))
+    finally:
+        total = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sys.stdout = stdout
+    first_row = output.first_row - start if output.first_row else total
+    print('%-12s rows: %d, first row: %.3fs, total: %.3fs, peak memory: %.1fMB' % (name, count, first_row, total, peak / 1e6))
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bench('print_table', print_table, count)
+    try:
+        bench('AsciiTable', ascii_table, count)
+    except ImportError:
+        print('AsciiTable   skipped for terminaltables is not installed')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+#
+# A stand-in ACM API server serving fake nodes, clusrun jobs and diagnostic jobs,
+# for testing the CLI without a cluster.
+#
+# Usage: python test/mock_server.py [--port PORT] [--nodes N] [--task-time SECONDS]
+#            [--output-size BYTES] [--failure-rate RATE] [--latency SECONDS]
+#            [--error-rate RATE] [--seed SEED]
+#
+# Then use "http://localhost:PORT/v1" as the "--host" parameter of the CLI.
+#
+# All tasks of a job are over "--task-time" seconds after the job is created. A
+# "--failure-rate" of tasks exit with 1, and fail diagnostic tests on their nodes.
+# Each request is answered after "--latency" seconds, and an "--error-rate" of them
+# are answered with 503 instead.
+
+from __future__ import print_function
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import datetime
+import threading
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+tests = [
+    {
+        'category': 'mpi',
+        'name': 'pingpong',
+        'description': 'Run Intel MPI Benchmark PingPong between pairs of nodes',
+        'arguments': [],
+    },
+    {
+        'category': 'mpi',
+        'name': 'ring',
+        'description': 'Run a ring of MPI processes over all nodes',
+        'arguments': [],
+    },
+    {
+        'category': 'benchmark',
+        'name': 'cpu',
+        'description': 'Run a CPU benchmark on each node',
+        'arguments': [],
+    },
+]
+
+class Cluster:
+    # Stragglers take this times the task time to finish
+    straggler_factor = 10
+
+    def __init__(self, node_count, task_time, output_size=None, failure_rate=0, straggler_rate=0):
+        self.nodes = ['node%06d' % (i + 1) for i in range(node_count)]
+        self.task_time = task_time
+        self.output_size = output_size
+        self.failure_rate = failure_rate
+        self.straggler_rate = straggler_rate
+        # Jobs by id, by kind, "clusrun" or "diagnostics"
+        self.jobs = { 'clusrun': {}, 'diagnostics': {} }
+        # Requests are served one by one with the lock held
+        self.lock = threading.Lock()
+
+    def node(self, name):
+        return {
+            'id': name,
+            'name': name,
+            'state': 'Online',
+            'health': 'OK',
+            'runningJobCount': 0,
+            'eventCount': 0,
+            'nodeRegistrationInfo': {
+                'nodeName': name,
+                'coreCount': 4,
+                'socketCount': 1,
+                'memoryMegabytes': 8192,
+                'distroInfo': 'Linux mock 4.15.0',
+            },
+        }
+
+    def create_job(self, kind, spec):
+        jobs = self.jobs[kind]
+        id = len(jobs) + 1
+        jobs[id] = {
+            'id': id,
+            'name': spec.get('name', ''),
+            'commandLine': spec.get('commandLine', ''),
+            'diagnosticTest': spec.get('diagnosticTest'),
+            'targetNodes': spec.get('targetNodes', []),
+            'createdAt': time.time(),
+            'canceledAt': None,
+        }
+        return id
+
+    def cancel_job(self, kind, id):
+        job = self.jobs[kind][id]
+        if job['canceledAt'] is None:
+            job['canceledAt'] = time.time()
+
+    # Time when a task is over, or None if it's not over yet
+    def task_end(self, job, task_id):
+        end = job['createdAt'] + self.task_time * (self.straggler_factor if self.is_straggler(job, task_id) else 1)
+        if job['canceledAt'] is not None:
+            end = min(end, job['canceledAt'])
+        return end if end <= time.time() else None
+
+    # Whether a task fails, by the failure rate, the same each time for a task
+    def task_failed(self, job, task_id):
+        key = ('%d-%d' % (job['id'], task_id)).encode('utf-8')
+        return zlib.crc32(key) % 10000 < self.failure_rate * 10000
+
+    # Whether a task is a straggler, by the straggler rate, the same each time for a task
+    def is_straggler(self, job, task_id):
+        key = ('straggler-%d-%d' % (job['id'], task_id)).encode('utf-8')
+        return zlib.crc32(key) % 10000 < self.straggler_rate * 10000
+
+    def task_state(self, job, task_id):
+        if self.task_end(job, task_id) is not None:
+            return 'Canceled' if job['canceledAt'] is not None else 'Finished'
+        return 'Running'
+
+    def job_state(self, job):
+        if job['canceledAt'] is not None:
+            return 'Canceled'
+        over = all(self.task_end(job, i + 1) is not None for i in range(len(job['targetNodes'])))
+        return 'Finished' if over else 'Running'
+
+    def job(self, kind, id):
+        job = self.jobs[kind][id]
+        created = datetime.datetime.utcfromtimestamp(job['createdAt']).isoformat() + 'Z'
+        obj = {
+            'id': id,
+            'type': 'ClusRun' if kind == 'clusrun' else 'Diagnostics',
+            'name': job['name'],
+            'commandLine': job['commandLine'],
+            'state': self.job_state(job),
+            'targetNodes': job['targetNodes'],
+            'progress': 0,
+            'requeueCount': 0,
+            'createdAt': created,
+            'updatedAt': created,
+        }
+        if job['diagnosticTest']:
+            obj['diagnosticTest'] = job['diagnosticTest']
+        return obj
+
+    def task(self, kind, job_id, task_id):
+        job = self.jobs[kind][job_id]
+        return {
+            'id': task_id,
+            'jobId': job_id,
+            'jobType': 'ClusRun' if kind == 'clusrun' else 'Diagnostics',
+            'state': self.task_state(job, task_id),
+            'commandLine': job['commandLine'],
+            'node': job['targetNodes'][task_id - 1],
+        }
+
+    def task_result(self, kind, job_id, task_id):
+        job = self.jobs[kind][job_id]
+        exited = self.task_end(job, task_id) is not None
+        exit_code = 1 if self.task_failed(job, task_id) else 0
+        return {
+            'jobId': job_id,
+            'taskId': task_id,
+            'nodeName': job['targetNodes'][task_id - 1],
+            'commandLine': job['commandLine'],
+            'exited': exited,
+            'exitCode': exit_code if exited else None,
+            'resultKey': '%d-%d' % (job_id, task_id),
+        }
+
+    # Result of a diagnostic job, aggregated from its tasks, or None if it's not over yet
+    def aggregation_result(self, id):
+        job = self.jobs['diagnostics'][id]
+        if self.job_state(job) == 'Running':
+            return None
+        good, bad = [], []
+        for task_id, node in enumerate(job['targetNodes'], 1):
+            (bad if self.task_failed(job, task_id) else good).append(node)
+        test = job['diagnosticTest'] or {}
+        if (test.get('category'), test.get('name')) == ('mpi', 'pingpong'):
+            return { 'GoodNodes': good, 'BadNodes': bad }
+        return { 'Passed': len(good), 'Failed': len(bad) }
+
+    # Output of a task and whether it's over. It's "--output-size" characters, if any,
+    # of lines after the first one.
+    def output(self, key):
+        job_id, task_id = [int(i) for i in key.split('-')]
+        job = self.jobs['clusrun'][job_id]
+        node = job['targetNodes'][task_id - 1]
+        if self.task_failed(job, task_id):
+            content = 'Error of "%s" on %s\n' % (job['commandLine'], node)
+        else:
+            content = 'Output of "%s" on %s\n' % (job['commandLine'], node)
+        if self.output_size:
+            line = '%s\n' % ('.' * 79)
+            content = (content + line * (self.output_size // len(line) + 1))[:self.output_size]
+        return content, self.task_end(job, task_id) is not None
+
+    def output_page(self, key, offset, page_size):
+        content, over = self.output(key)
+        if offset < 0:
+            offset = max(len(content) - page_size, 0)
+        page = content[offset:offset + page_size]
+        return {
+            'eof': over and offset + len(page) >= len(content),
+            'offset': offset,
+            'size': len(page),
+            'content': page,
+        }
+
+class NotFound(Exception):
+    pass
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, so send them without waiting for acks
+    disable_nagle_algorithm = True
+
+    # Methods, paths and handlers. A path of jobs is of either kind of jobs.
+    routes = [
+        ('GET', r'/nodes', 'get_nodes'),
+        ('GET', r'/nodes/([^/]+)', 'get_node'),
+        ('GET', r'/diagnostics/tests', 'get_tests'),
+        ('GET', r'/(clusrun|diagnostics)', 'get_jobs'),
+        ('POST', r'/(clusrun|diagnostics)', 'create_job'),
+        ('GET', r'/(clusrun|diagnostics)/(\d+)', 'get_job'),
+        ('PATCH', r'/(clusrun|diagnostics)/(\d+)', 'cancel_job'),
+        ('GET', r'/(clusrun|diagnostics)/(\d+)/tasks', 'get_tasks'),
+        ('GET', r'/(clusrun|diagnostics)/(\d+)/tasks/(\d+)', 'get_task'),
+        ('GET', r'/(clusrun|diagnostics)/(\d+)/tasks/(\d+)/result', 'get_task_result'),
+        ('GET', r'/diagnostics/(\d+)/aggregationResult', 'get_aggregation_result'),
+        ('GET', r'/output/clusrun/([^/]+)/page', 'get_output_page'),
+        ('GET', r'/output/clusrun/([^/]+)/raw', 'get_output'),
+    ]
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def log_message(self, format, *args):
+        pass
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        path = re.sub(r'^/v1', '', url.path)
+        self.query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+        # Latency is out of the lock, so that requests wait for it concurrently
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and self.server.random() < self.server.error_rate:
+            self.reply(503, {'error': 'Service unavailable'})
+            return
+        for m, pattern, name in self.routes:
+            match = re.match('^%s$' % pattern, path)
+            if m == method and match:
+                try:
+                    with self.server.cluster.lock:
+                        result = getattr(self, name)(*[unquote(g) for g in match.groups()])
+                except (NotFound, KeyError, IndexError, ValueError):
+                    self.reply(404, {'error': 'Not found'})
+                else:
+                    self.reply(200, result)
+                return
+        self.reply(404, {'error': 'No such API'})
+
+    def reply(self, status, result):
+        if isinstance(result, str):
+            body = result.encode('utf-8')
+            content_type = 'text/plain'
+        else:
+            body = json.dumps(result).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, items, key):
+        last_id = self.query.get('lastId')
+        count = int(self.query.get('count', 1000))
+        reverse = self.query.get('reverse', 'false').lower() == 'true'
+        if reverse:
+            items = list(reversed(items))
+        # The generated client sends "None" for a missing last id
+        if last_id not in (None, '', 'None'):
+            ids = [str(key(i)) for i in items]
+            start = ids.index(last_id) + 1 if last_id in ids else len(items)
+            items = items[start:]
+        return items[:count]
+
+    @property
+    def cluster(self):
+        return self.server.cluster
+
+    def get_nodes(self):
+        return [self.cluster.node(n) for n in self.page(self.cluster.nodes, lambda n: n)]
+
+    def get_node(self, id):
+        if id not in self.cluster.nodes:
+            raise NotFound()
+        return self.cluster.node(id)
+
+    def get_tests(self):
+        return tests
+
+    def get_jobs(self, kind):
+        return [self.cluster.job(kind, i) for i in self.page(sorted(self.cluster.jobs[kind]), lambda i: i)]
+
+    def create_job(self, kind):
+        return self.cluster.job(kind, self.cluster.create_job(kind, self.body))
+
+    def get_job(self, kind, id):
+        return self.cluster.job(kind, int(id))
+
+    def cancel_job(self, kind, id):
+        self.cluster.cancel_job(kind, int(id))
+        return self.cluster.job(kind, int(id))
+
+    def get_tasks(self, kind, id):
+        job = self.cluster.jobs[kind][int(id)]
+        task_ids = list(range(1, len(job['targetNodes']) + 1))
+        return [self.cluster.task(kind, int(id), i) for i in self.page(task_ids, lambda i: i)]
+
+    def get_task(self, kind, id, task_id):
+        return self.cluster.task(kind, int(id), int(task_id))
+
+    def get_task_result(self, kind, id, task_id):
+        return self.cluster.task_result(kind, int(id), int(task_id))
+
+    def get_aggregation_result(self, id):
+        result = self.cluster.aggregation_result(int(id))
+        if result is None:
+            raise NotFound()
+        return result
+
+    def get_output_page(self, key):
+        return self.cluster.output_page(key, int(self.query.get('offset', 0)), int(self.query.get('pageSize', 1024)))
+
+    def get_output(self, key):
+        return self.cluster.output(key)[0]
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description='A stand-in ACM API server')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--nodes', type=int, default=100, help='number of nodes')
+    parser.add_argument('--task-time', type=float, default=1, help='seconds for a task to finish')
+    parser.add_argument('--output-size', type=int, help='characters of output of each task')
+    parser.add_argument('--failure-rate', type=float, default=0, help='rate of tasks to fail, from 0 to 1')
+    parser.add_argument('--latency', type=float, default=0, help='seconds to wait before answering a request')
+    parser.add_argument('--error-rate', type=float, default=0, help='rate of requests to answer with 503, from 0 to 1')
+    parser.add_argument('--straggler-rate', type=float, default=0, help='rate of tasks to take %d times the task time, from 0 to 1' % Cluster.straggler_factor)
+    parser.add_argument('--seed', type=int, help='seed of random errors')
+    args = parser.parse_args()
+    server = Server(('localhost', args.port), Handler)
+    server.cluster = Cluster(args.nodes, args.task_time, args.output_size, args.failure_rate, args.straggler_rate)
+    server.latency = args.latency
+    server.error_rate = args.error_rate
+    server.random = random.Random(args.seed).random
+    print('Serving on http://localhost:%d/v1' % args.port)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import time
+import threading
+import unittest
+from hpc_acm_cli.async_op import AsyncOp, ReadyOp, Scheduler, async_iter, async_wait
+
+class Api:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, value, delay):
+        self.calls.append(value)
+        time.sleep(delay)
+        return value
+
+class GetOp(AsyncOp):
+    def __init__(self, api, scheduler, value, delay):
+        self.scheduler = scheduler
+        self.async_value = self.call(api.get, value, delay)
+
+    def get_result(self):
+        if not self.async_value.ready():
+            raise AsyncOp.NotReady()
+        return self.async_value.get()
+
+class AsyncIterTest(unittest.TestCase):
+    def setUp(self):
+        self.api = Api()
+        self.scheduler = Scheduler(4)
+
+    def test_in_order(self):
+        # Later ops are over before earlier ones
+        ops = [GetOp(self.api, self.scheduler, i, 0.05 * (5 - i)) for i in range(5)]
+        self.assertEqual(list(async_iter(ops, 10)), [0, 1, 2, 3, 4])
+
+    def test_ready_ops(self):
+        ops = [ReadyOp('a'), GetOp(self.api, self.scheduler, 'b', 0.01), ReadyOp('c')]
+        self.assertEqual(list(async_iter(ops, 2)), ['a', 'b', 'c'])
+
+    def test_window(self):
+        taken = []
+
+        def ops():
+            for i in range(10):
+                taken.append(i)
+                yield ReadyOp(i)
+
+        results = async_iter(ops(), 3)
+        self.assertEqual(next(results), 0)
+        self.assertEqual(taken, [0, 1, 2])
+        self.assertEqual(next(results), 1)
+        self.assertEqual(taken, [0, 1, 2, 3])
+        self.assertEqual(list(results), list(range(2, 10)))
+
+    def test_empty(self):
+        self.assertEqual(list(async_iter([], 3)), [])
+
+class Calls:
+    '''
+    Functions blocking until released, named as endpoints, with the count of calls of
+    them running at the same time
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+        self.started = []
+        self.released = threading.Event()
+
+    def func(self, endpoint):
+        def call(value):
+            with self.lock:
+                for key in (endpoint, None):
+                    self.running[key] = self.running.get(key, 0) + 1
+                    self.max_running[key] = max(self.max_running.get(key, 0), self.running[key])
+                self.started.append(value)
+            self.released.wait(5)
+            with self.lock:
+                for key in (endpoint, None):
+                    self.running[key] -= 1
+            return value
+        call.__name__ = endpoint
+        return call
+
+    # Wait for the number of calls to be started
+    def wait_started(self, count):
+        deadline = time.time() + 5
+        while len(self.started) < count and time.time() < deadline:
+            time.sleep(0.01)
+        # Let others be started, if they were to
+        time.sleep(0.05)
+
+class CallOp(GetOp):
+    def __init__(self, scheduler, func, value):
+        self.scheduler = scheduler
+        self.async_value = self.call(func, value)
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = Calls()
+
+    def tearDown(self):
+        self.calls.released.set()
+
+    def test_max_in_flight(self):
+        scheduler = Scheduler(2)
+        ops = [CallOp(scheduler, self.calls.func('get'), i) for i in range(6)]
+        self.calls.wait_started(2)
+        self.assertEqual(len(self.calls.started), 2)
+        self.calls.released.set()
+        self.assertEqual(async_wait(ops), list(range(6)))
+        self.assertEqual(self.calls.max_running[None], 2)
+
+    def test_endpoint_limit(self):
+        scheduler = Scheduler(4, { 'slow': 1 })
+        ops = [CallOp(scheduler, self.calls.func('slow'), i) for i in range(3)]
+        ops += [CallOp(scheduler, self.calls.func('fast'), i) for i in range(3, 6)]
+        self.calls.wait_started(4)
+        self.assertEqual(sorted(self.calls.started), [0, 3, 4, 5])
+        self.calls.released.set()
+        self.assertEqual(async_wait(ops), list(range(6)))
+        self.assertEqual(self.calls.max_running['slow'], 1)
+
+    def test_fifo(self):
+        scheduler = Scheduler(1)
+        ops = [CallOp(scheduler, self.calls.func(name), i) for i, name in enumerate(['a', 'b', 'a', 'c', 'b'])]
+        self.calls.released.set()
+        async_wait(ops)
+        self.assertEqual(self.calls.started, [0, 1, 2, 3, 4])
+
+    def test_not_blocked_by_endpoint_at_limit(self):
+        scheduler = Scheduler(2, { 'slow': 1 })
+        slow = [CallOp(scheduler, self.calls.func('slow'), i) for i in range(2)]
+        # Behind the second slow call, which waits for the first one
+        fast = CallOp(scheduler, self.calls.func('fast'), 2)
+        self.calls.wait_started(2)
+        self.assertEqual(self.calls.started, [0, 2])
+        self.calls.released.set()
+        self.assertEqual(async_wait(slow + [fast]), [0, 1, 2])
+
+class DelayedGetOp(GetOp):
+    def __init__(self, api, scheduler, value, delay):
+        self.scheduler = scheduler
+        self.async_value = self.call_later(delay, api.get, value, 0)
+
+class CallLaterTest(unittest.TestCase):
+    def setUp(self):
+        self.api = Api()
+        self.scheduler = Scheduler(4)
+
+    def test_call_later(self):
+        start = time.time()
+        ops = [DelayedGetOp(self.api, self.scheduler, i, 0.1 * (3 - i)) for i in range(3)]
+        self.assertEqual(async_wait(ops), [0, 1, 2])
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        # Submitted when due, the earliest first
+        self.assertEqual(self.api.calls, [2, 1, 0])
+
+    def test_not_taking_a_slot(self):
+        scheduler = Scheduler(1)
+        later = DelayedGetOp(self.api, scheduler, 'later', 0.2)
+        now = GetOp(self.api, scheduler, 'now', 0)
+        self.assertEqual(async_wait([now]), ['now'])
+        self.assertEqual(self.api.calls, ['now'])
+        self.assertEqual(async_wait([later]), ['later'])
+
+class AsyncWaitTest(unittest.TestCase):
+    def setUp(self):
+        self.api = Api()
+        self.scheduler = Scheduler(4)
+
+    def test_all(self):
+        ops = [GetOp(self.api, self.scheduler, i, 0.01) for i in range(3)]
+        self.assertEqual(async_wait(ops), [0, 1, 2])
+
+    def test_quorum(self):
+        ops = [GetOp(self.api, self.scheduler, i, 0.01 if i < 2 else 1) for i in range(4)]
+        done = []
+        async_wait(ops, lambda idx, result: done.append(result), quorum=2)
+        self.assertEqual(sorted(done), [0, 1])
+
+    def test_timeout(self):
+        ops = [GetOp(self.api, self.scheduler, 0, 0.01), GetOp(self.api, self.scheduler, 1, 1)]
+        start = time.time()
+        self.assertEqual(async_wait(ops, timeout=0.2), [0, None])
+        self.assertLess(time.time() - start, 0.9)
+
+    def test_timeout_over(self):
+        # Ops done by then are taken, though no time is left to wait for them
+        done = GetOp(self.api, self.scheduler, 1, 0)
+        time.sleep(0.05)
+        ops = [ReadyOp(0), done, GetOp(self.api, self.scheduler, 2, 1)]
+        self.assertEqual(async_wait(ops, timeout=0), [0, 1, None])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from hpc_acm_cli.clus import Clusrun
+from hpc_acm_cli.async_op import AsyncOp, Scheduler
+from hpc_acm_cli.polling import PollTimeout
+
+class Job:
+    def __init__(self, id, state='Running', target_nodes=None):
+        self.id = id
+        self.state = state
+        self.target_nodes = target_nodes or []
+
+class Task:
+    def __init__(self, id, node, state='Finished', job_id=1):
+        self.id = id
+        self.node = node
+        self.state = state
+        self.job_id = job_id
+
+class TaskResult:
+    def __init__(self, task_id, exit_code=0):
+        self.result_key = 'key%d' % task_id
+        self.exit_code = exit_code
+
+class Page:
+    def __init__(self, content, offset, eof):
+        self.content = content
+        self.offset = offset
+        self.size = len(content)
+        self.eof = eof
+
+class FakeApi:
+    '''
+    A stand-in for DefaultApi of a server with a job, its tasks, and output of them,
+    by result key, which is over
+    '''
+
+    def __init__(self, job, tasks=None, outputs=None):
+        self.job = job
+        self.tasks = tasks or []
+        self.outputs = outputs or {}
+        # Exit codes of tasks other than 0, by task id
+        self.exit_codes = {}
+        # Offsets of pages got, by result key
+        self.offsets = {}
+
+    def get_clusrun_job(self, id):
+        return self.job
+
+    def get_clusrun_tasks(self, id, count=None, last_id=None):
+        return self.tasks
+
+    def get_clusrun_task_result(self, job_id, task_id):
+        return TaskResult(task_id, self.exit_codes.get(task_id, 0))
+
+    def get_clusrun_output_in_page(self, key, offset=None, page_size=None):
+        self.offsets.setdefault(key, []).append(offset)
+        output = self.outputs[key]
+        content = output[offset:offset + page_size]
+        return Page(content, offset, offset + len(content) >= len(output))
+
+# An op of a task with its result, or one never done for None
+class TaskOp(AsyncOp):
+    def __init__(self, task, result=None):
+        self.task = task
+        self.result = result
+
+    def get_result(self):
+        if self.result is None:
+            raise AsyncOp.NotReady()
+        return self.result
+
+# A Clusrun command, without connecting to the server, with the args of the parameters
+def clusrun(api, **args):
+    defaults = {
+        'task_timeout': None,
+        'wait_for': None,
+        'poll_timeout': None,
+        'cancel_stragglers': False,
+    }
+    defaults.update(args)
+    command = Clusrun.__new__(Clusrun)
+    command.api = api
+    command.scheduler = Scheduler(4)
+    command.job_cache = None
+    command.over_at = {}
+    command.args = argparse.Namespace(**defaults)
+    return command
+
+class ClusTest(unittest.TestCase):
+    def setUp(self):
+        self.stderr = sys.stderr
+        sys.stderr = io.StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+
+class WaitTest(ClusTest):
+    def test_output_grace(self):
+        command = clusrun(FakeApi(Job(1)), task_timeout=1)
+        command.output_grace = 0.1
+        command.wait_start = time.time() - 1
+        command.deadline = time.time()
+        ops = [TaskOp(Task(1, 'node1'), 'output1'), TaskOp(Task(2, 'node2')), TaskOp(Task(3, 'node3', state='Running'))]
+        results = {}
+        with self.assertRaises(PollTimeout):
+            command.wait_task_outputs(ops, results.__setitem__, 'Loading')
+        self.assertEqual(results, { 0: 'output1' })
+        err = sys.stderr.getvalue()
+        self.assertIn('Output of 1 tasks over is not got in 0.1 seconds more: node2', err)
+        self.assertIn('1 tasks not over in', err)
+
+    def test_wait_tasks_by_deadline(self):
+        command = clusrun(FakeApi(Job(1, target_nodes=['node1'])), task_timeout=0.2)
+        command.deadline = time.time() + 0.2
+        start = time.time()
+        with self.assertRaises(PollTimeout):
+            command.wait_tasks(Job(1))
+        self.assertLess(time.time() - start, 1)
+
+    def test_wait_tasks(self):
+        tasks = [Task(1, 'node1')]
+        command = clusrun(FakeApi(Job(1, target_nodes=['node1']), tasks))
+        self.assertEqual(command.wait_tasks(Job(1)), tasks)
+
+class SaveTaskOutputTest(ClusTest):
+    def setUp(self):
+        ClusTest.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.tasks = [Task(1, 'node1'), Task(2, 'node2')]
+        self.api = FakeApi(Job(1), self.tasks, { 'key1': 'hello world\n', 'key2': '' })
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        ClusTest.tearDown(self)
+
+    def path(self, node):
+        return os.path.join(self.dir, '1', '%s.log' % node)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def write(self, path, content):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def save(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            clusrun(self.api, save_dir=self.dir).save_task_outputs(Job(1), self.tasks)
+        return out.getvalue()
+
+    def test_save(self):
+        out = self.save()
+        self.assertEqual(self.read(self.path('node1')), 'hello world\n')
+        self.assertEqual(self.read(self.path('node2')), '')
+        # Partial files are renamed to the paths
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dir, '1'))), ['node1.log', 'node2.log'])
+        self.assertIn('node1: %s saved, exit code 0' % self.path('node1'), out)
+
+    def test_resume(self):
+        self.write(self.path('node1') + '.part', 'hello ')
+        self.save()
+        self.assertEqual(self.api.offsets['key1'], [6])
+        self.assertEqual(self.read(self.path('node1')), 'hello world\n')
+        self.assertFalse(os.path.exists(self.path('node1') + '.part'))
+
+    def test_skip_saved(self):
+        self.write(self.path('node1'), 'saved')
+        out = self.save()
+        self.assertNotIn('key1', self.api.offsets)
+        self.assertEqual(self.read(self.path('node1')), 'saved')
+        self.assertIn('node1: %s exists' % self.path('node1'), out)
+        self.assertEqual(self.api.offsets['key2'], [0])
+
+class CollapseTest(ClusTest):
+    def test_collapse(self):
+        tasks = [Task(i, 'node%d' % i) for i in range(1, 8)]
+        api = FakeApi(Job(1), tasks, dict(('key%d' % t.id, 'same\n') for t in tasks))
+        api.outputs['key3'] = 'other\n'
+        api.exit_codes = { 6: 1, 7: 1 }
+        # Output of node5 is from the job cache
+        cached = [(tasks[4], TaskResult(5), 'same\n')]
+        out = io.StringIO()
+        with redirect_stdout(out):
+            clusrun(api).collapse_task_outputs(tasks[:4] + tasks[5:], cached)
+        # By the number of nodes, with those of the same output and exit code in ranges
+        self.assertEqual(out.getvalue().splitlines(), [
+            '#### node[1-2,4-5](0) ####',
+            'same',
+            '',
+            '#### node[6-7](1) ####',
+            'same',
+            '',
+            '#### node3(0) ####',
+            'other',
+            '',
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
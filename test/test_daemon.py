@@ -0,0 +1,115 @@
+import io
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from hpc_acm_cli import daemon
+from hpc_acm_cli.daemon import Cancelable, ThreadStream, WorkDir
+
+@unittest.skipUnless(daemon.available(), 'Unix domain sockets are not supported')
+class ForwardTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'daemon')
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(1)
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.dir)
+        os.environ.pop(daemon.bypass_env, None)
+
+    def test_not_accepted(self):
+        # A daemon not responding, whose backlog takes the connection
+        timeout, daemon.timeout = daemon.timeout, 0.1
+        try:
+            self.assertIsNone(daemon.forward(self.path, 'Node', ['list']))
+        finally:
+            daemon.timeout = timeout
+
+    def test_bypass(self):
+        os.environ[daemon.bypass_env] = '1'
+        self.server.settimeout(0.1)
+        self.assertIsNone(daemon.forward(self.path, 'Node', ['list']))
+        self.assertRaises(socket.timeout, self.server.accept)
+
+class CancelableTest(unittest.TestCase):
+    def test_canceled_by_close(self):
+        conn, client = socket.socketpair()
+        started = threading.Event()
+
+        def command():
+            started.set()
+            while True:
+                time.sleep(0.01)
+
+        def close():
+            started.wait()
+            client.close()
+
+        threading.Thread(target=close).start()
+        self.assertEqual(Cancelable(conn).run(command), 100)
+        conn.close()
+
+    def test_not_canceled_after_end(self):
+        conn, client = socket.socketpair()
+        self.assertEqual(Cancelable(conn).run(lambda: 0), 0)
+        client.close()
+        time.sleep(0.05)
+        conn.close()
+
+class ThreadStreamTest(unittest.TestCase):
+    def test_by_thread(self):
+        default, mine, other = io.StringIO(), io.StringIO(), io.StringIO()
+        stream = ThreadStream(default)
+        stream.set(mine)
+
+        def write():
+            stream.set(other)
+            stream.write('other')
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        stream.write('mine')
+        stream.set(None)
+        stream.write('default')
+        self.assertEqual((default.getvalue(), mine.getvalue(), other.getvalue()), ('default', 'mine', 'other'))
+
+class WorkDirTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        for d in self.dirs:
+            shutil.rmtree(d)
+
+    def test_take_turns(self):
+        workdir = WorkDir()
+        workdir.enter(self.dirs[0])
+        # The same directory at the same time
+        workdir.enter(self.dirs[0])
+        entered = threading.Event()
+
+        def enter_other():
+            workdir.enter(self.dirs[1])
+            entered.set()
+            workdir.exit()
+
+        thread = threading.Thread(target=enter_other)
+        thread.start()
+        workdir.exit()
+        self.assertFalse(entered.wait(0.1))
+        workdir.exit()
+        self.assertTrue(entered.wait(1))
+        thread.join()
+        self.assertEqual(os.path.realpath(os.getcwd()), os.path.realpath(self.dirs[1]))
+
+if __name__ == '__main__':
+    unittest.main()
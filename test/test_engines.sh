@@ -0,0 +1,66 @@
+#!/bin/bash
+#
+# Test clusrun with each engine against the stand-in ACM server in mock_server.py.
+# The "asyncio" engine requires the "aiohttp" package.
+
+set -o xtrace
+
+dir=$(dirname "$0")
+port=${PORT:-18080}
+nodes=${NODES:-50}
+host="http://localhost:$port/v1"
+
+python "$dir/mock_server.py" --port $port --nodes $nodes --task-time 1 &
+server=$!
+trap "kill $server" EXIT
+sleep 1
+
+function clusrun
+{
+  python -m hpc_acm_cli.clus "$@" --host "$host"
+}
+
+function test_engine
+{
+  local engine=${1:?engine is required}
+
+  # Test new with task output
+  local result=$(clusrun new --pattern '*' 'hostname' --engine $engine 2>/dev/null)
+  if (($(grep -c '^#### node[0-9]*(.*) ####$' <<<"$result") != nodes)); then
+    return 1
+  fi
+
+  # Test new with streaming task output
+  result=$(clusrun new --pattern '*' 'hostname' --stream --engine $engine 2>/dev/null)
+  if (($(grep -c '^node[0-9]*: #### exit code .* ####$' <<<"$result") != nodes)); then
+    return 1
+  fi
+
+  # Test show of the task results
+  result=$(clusrun show 2 --short --engine $engine 2>/dev/null)
+  if (($(grep -c '/output/clusrun/.*/raw' <<<"$result") != nodes)); then
+    return 1
+  fi
+}
+
+# Test stopping waiting by --task-timeout, after progress has taken all the time, with
+# stragglers of 10 seconds on a server of their own
+function test_task_timeout
+{
+  local port=$((port + 1))
+  python "$dir/mock_server.py" --port $port --nodes 20 --task-time 1 --straggler-rate 0.2 >/dev/null &
+  local server=$!
+  sleep 1
+
+  local err=$(mktemp) result code
+  result=$(python -m hpc_acm_cli.clus new --pattern '*' 'hostname' --progress --progress-interval 0.5 \
+    --task-timeout 3 --host "http://localhost:$port/v1" 2>"$err")
+  code=$?
+  local stragglers=$(grep -o '^[0-9]* stragglers' "$err" | cut -d ' ' -f 1)
+  local outputs=$(grep -c '^#### node[0-9]*(.*) ####$' <<<"$result")
+  rm -f "$err"
+  kill $server
+  ((code == 2 && stragglers > 0 && outputs > 0 && outputs + stragglers == 20))
+}
+
+test_engine thread && test_engine asyncio && test_task_timeout
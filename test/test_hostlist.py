@@ -0,0 +1,49 @@
+import unittest
+from hpc_acm_cli.hostlist import expand_hostlist, compress_hostlist
+from hpc_acm_cli.utils import compile_patterns
+
+class HostlistTest(unittest.TestCase):
+    def expand(self, hostlist):
+        return list(expand_hostlist(hostlist))
+
+    def test_expand_names(self):
+        self.assertEqual(self.expand('node1 node2,node3'), ['node1', 'node2', 'node3'])
+
+    def test_expand_ranges(self):
+        self.assertEqual(self.expand('node[001-003,010]'), ['node001', 'node002', 'node003', 'node010'])
+        self.assertEqual(self.expand('n[9-11]-ib'), ['n9-ib', 'n10-ib', 'n11-ib'])
+
+    def test_expand_product(self):
+        self.assertEqual(self.expand('r[1-2]n[1-2]'), ['r1n1', 'r1n2', 'r2n1', 'r2n2'])
+
+    def test_expand_lazily(self):
+        names = expand_hostlist('node[1-1000000000]')
+        self.assertEqual(next(names), 'node1')
+
+    def test_invalid(self):
+        for hostlist in ['node[1-', 'node[a]', 'node[3-1]', 'node]']:
+            with self.assertRaises(ValueError):
+                self.expand(hostlist)
+
+    def test_compress(self):
+        self.assertEqual(compress_hostlist(['node003', 'node001', 'node002', 'node010', 'head']), 'head,node[001-003,010]')
+        self.assertEqual(compress_hostlist(['n10', 'n9', 'n11', 'n1']), 'n[1,9-11]')
+        self.assertEqual(compress_hostlist(['node099', 'node100']), 'node[099-100]')
+        self.assertEqual(compress_hostlist(['n1-ib', 'n2-ib', 'n1']), 'n1,n[1-2]-ib')
+        self.assertEqual(compress_hostlist([]), '')
+
+    def test_round_trip(self):
+        names = ['node%04d' % i for i in range(1, 5000) if i % 7]
+        self.assertEqual(self.expand(compress_hostlist(names)), names)
+
+class PatternsTest(unittest.TestCase):
+    def test_include_and_exclude(self):
+        match = compile_patterns('node* head !node0*')
+        self.assertEqual([n for n in ['node01', 'node10', 'head', 'other'] if match(n)], ['node10', 'head'])
+
+    def test_exclude_only(self):
+        match = compile_patterns('!node0*')
+        self.assertEqual([n for n in ['node01', 'node10', 'head'] if match(n)], ['node10', 'head'])
+
+if __name__ == '__main__':
+    unittest.main()
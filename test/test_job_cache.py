@@ -0,0 +1,102 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+from hpc_acm_cli.job_cache import JobCache
+
+class JobCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'jobs')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def cache(self, host='host', max_size=1000):
+        return JobCache(self.path, host, max_size, clock=lambda: self.now)
+
+    def tick(self):
+        self.now += 1
+
+    def test_get_and_put(self):
+        cache = self.cache()
+        self.assertIsNone(cache.get('job', 1))
+        cache.put('job', 1, '{"id": 1}')
+        self.assertEqual(cache.get('job', 1), '{"id": 1}')
+        cache.close()
+        self.assertEqual(self.cache().get('job', 1), '{"id": 1}')
+
+    def test_keyed_by_host(self):
+        cache = self.cache()
+        cache.put('job', 1, 'a')
+        cache.close()
+        self.assertIsNone(self.cache(host='other').get('job', 1))
+
+    def test_large_entry_in_file(self):
+        cache = self.cache(max_size=10 ** 6)
+        data = 'x' * (JobCache.inline_size + 1)
+        cache.put('output', 'key', data)
+        self.assertEqual(len(os.listdir(os.path.join(self.path, 'blobs'))), 1)
+        cache.close()
+        self.assertEqual(self.cache().get('output', 'key'), data)
+
+    def test_private(self):
+        self.cache().connect()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode) & 0o077, 0)
+
+    def test_evict_least_recently_used(self):
+        cache = self.cache(max_size=250)
+        for id in range(3):
+            cache.put('job', id, 'x' * 100)
+            self.tick()
+        cache.get('job', 0)
+        cache.close()
+        cache = self.cache()
+        self.assertIsNotNone(cache.get('job', 0))
+        self.assertIsNone(cache.get('job', 1))
+        self.assertIsNotNone(cache.get('job', 2))
+
+    def test_evict_file(self):
+        cache = self.cache(max_size=JobCache.inline_size)
+        cache.put('output', 'key', 'x' * (JobCache.inline_size + 1))
+        cache.close()
+        self.assertEqual(os.listdir(os.path.join(self.path, 'blobs')), [])
+        self.assertIsNone(self.cache().get('output', 'key'))
+
+    def test_shared_by_processes(self):
+        cache = self.cache()
+        cache.put('job', 1, 'a')
+        cache.get('job', 1)
+        # Another one, like that of another process, reads and writes while it's open
+        other = self.cache()
+        other.busy_timeout = 0
+        self.assertEqual(other.get('job', 1), 'a')
+        other.put('job', 2, 'b')
+        self.assertEqual(cache.get('job', 2), 'b')
+        other.close()
+        cache.close()
+
+    def test_evict_in_use(self):
+        cache = self.cache(max_size=250)
+        for id in range(3):
+            cache.put('job', id, 'x' * 100)
+        self.now += JobCache.evict_interval
+        cache.put('job', 3, 'x' * 100)
+        other = self.cache()
+        self.assertIsNone(other.get('job', 0))
+        self.assertIsNotNone(other.get('job', 3))
+        cache.close()
+
+    def test_broken_database(self):
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, 'cache.db'), 'w') as f:
+            f.write('not a database' * 100)
+        cache = self.cache()
+        cache.put('job', 1, 'a')
+        self.assertIsNone(cache.get('job', 1))
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+from hpc_acm_cli.node_cache import NodeCache
+
+class Node:
+    def __init__(self, name):
+        self.id = name
+        self.name = name
+
+class NodeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'nodes')
+        self.nodes = ['node010', 'node020']
+        self.listed = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def cache(self, host='host', ttl=60):
+        return NodeCache(self.path, host, ttl, clock=lambda: self.now)
+
+    def iter_nodes(self):
+        self.listed += 1
+        return (Node(n) for n in sorted(self.nodes))
+
+    def test_within_ttl(self):
+        self.assertEqual(self.cache().names(self.iter_nodes), ['node010', 'node020'])
+        self.nodes.append('node030')
+        self.now += 60
+        self.assertEqual(self.cache().names(self.iter_nodes), ['node010', 'node020'])
+        self.assertEqual(self.listed, 1)
+
+    def test_refresh_after_ttl(self):
+        self.cache().names(self.iter_nodes)
+        # New nodes in the middle of the order, and a node removed
+        self.nodes = ['node005', 'node015', 'node020']
+        self.now += 61
+        self.assertEqual(self.cache().names(self.iter_nodes), ['node005', 'node015', 'node020'])
+
+    def test_refresh(self):
+        self.cache().names(self.iter_nodes)
+        self.nodes.append('node001')
+        self.assertEqual(self.cache().names(self.iter_nodes, refresh=True), ['node001', 'node010', 'node020'])
+
+    def test_fractional_ttl(self):
+        self.cache(ttl=0.5).names(self.iter_nodes)
+        self.now += 0.4
+        self.cache(ttl=0.5).names(self.iter_nodes)
+        self.assertEqual(self.listed, 1)
+        self.now += 0.2
+        self.cache(ttl=0.5).names(self.iter_nodes)
+        self.assertEqual(self.listed, 2)
+
+    def test_keyed_by_host(self):
+        self.cache().names(self.iter_nodes)
+        self.nodes = ['other']
+        self.assertEqual(self.cache(host='other').names(self.iter_nodes), ['other'])
+        self.assertEqual(self.cache().names(self.iter_nodes), ['node010', 'node020'])
+
+    # Threads of "clus daemon" save the cache at the same time
+    def test_concurrent_save(self):
+        errors = []
+
+        def refresh():
+            try:
+                for i in range(50):
+                    self.cache().names(self.iter_nodes, refresh=True)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=refresh) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.dir), ['nodes'])
+        self.assertEqual(self.cache().names(self.iter_nodes), ['node010', 'node020'])
+
+if __name__ == '__main__':
+    unittest.main()
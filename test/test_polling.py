@@ -0,0 +1,68 @@
+import unittest
+from hpc_acm_cli.polling import Poller, PollTimeout
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class PollerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def poller(self, **kwargs):
+        options = dict(interval=1, max_interval=8, factor=2, jitter=0)
+        options.update(kwargs)
+        return Poller(clock=self.clock.time, sleep=self.clock.sleep, **options)
+
+    # A "get" function returning the states one by one
+    def states(self, *states):
+        states = list(states)
+        return lambda: states.pop(0)
+
+    def test_over_at_first(self):
+        result = self.poller().poll(self.states('Finished'), lambda s: s == 'Finished')
+        self.assertEqual(result, 'Finished')
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_backoff_up_to_max_interval(self):
+        get = self.states(*(['Queued'] * 6 + ['Finished']))
+        self.poller().poll(get, lambda s: s == 'Finished', state=lambda s: s)
+        self.assertEqual(self.clock.sleeps, [1, 2, 4, 8, 8, 8])
+
+    def test_reset_on_state_change(self):
+        get = self.states('Queued', 'Queued', 'Queued', 'Running', 'Running', 'Finished')
+        self.poller().poll(get, lambda s: s == 'Finished', state=lambda s: s)
+        self.assertEqual(self.clock.sleeps, [1, 2, 4, 1, 2])
+
+    def test_jitter(self):
+        get = self.states('Queued', 'Queued', 'Finished')
+        self.poller(jitter=0.5, random=lambda: 1).poll(get, lambda s: s == 'Finished')
+        self.assertEqual(self.clock.sleeps, [1.5, 3])
+
+    def test_timeout(self):
+        poller = self.poller(timeout=10)
+        with self.assertRaises(PollTimeout):
+            poller.poll(lambda: 'Queued', lambda s: s == 'Finished')
+        self.assertEqual(self.clock.sleeps, [1, 2, 4, 3])
+        self.assertEqual(self.clock.now, 10)
+
+    def test_progress(self):
+        progress = []
+        get = self.states('Queued', 'Running', 'Finished')
+        self.poller().poll(get, lambda s: s == 'Finished', progress=progress.append)
+        self.assertEqual(progress, ['Queued', 'Running'])
+
+    def test_delays(self):
+        delays = self.poller().delays()
+        self.assertEqual([next(delays) for _ in range(6)], [1, 2, 4, 8, 8, 8])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import io
+import unittest
+from hpc_acm_cli.progress import Progress
+
+class Task:
+    def __init__(self, state):
+        self.state = state
+
+class Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+class ProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.file = io.StringIO()
+
+    def progress(self, total, interval=1, file=None):
+        return Progress(total, interval, file or self.file, clock=lambda: self.now)
+
+    def test_count(self):
+        tasks = [Task('Running'), Task('Finished'), Task('Running')]
+        self.assertEqual(Progress.count(tasks), { 'Running': 2, 'Finished': 1 })
+
+    def test_format(self):
+        progress = self.progress(10)
+        progress.update({ 'Running': 8 })
+        self.now = 2
+        progress.update({ 'Running': 4, 'Finished': 3, 'Failed': 1 })
+        lines = self.file.getvalue().splitlines()
+        self.assertEqual(lines[0], 'Queued 0, Dispatching 0, Running 8, Finished 0, Failed 0, Canceled 0, Not created 2 | 0/10 over, 0.0 tasks/s, ETA ?')
+        self.assertEqual(lines[1], 'Queued 0, Dispatching 0, Running 4, Finished 3, Failed 1, Canceled 0, Not created 2 | 4/10 over, 2.0 tasks/s, ETA 0:00:03')
+
+    def test_rate_limited(self):
+        progress = self.progress(2, interval=5)
+        progress.update({ 'Running': 2 })
+        self.now = 1
+        progress.update({ 'Running': 1, 'Finished': 1 })
+        self.assertEqual(len(self.file.getvalue().splitlines()), 1)
+        self.now = 2
+        progress.close({ 'Finished': 2 })
+        lines = self.file.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith('2/2 over, 1.0 tasks/s, ETA 0:00:00'))
+
+    def test_redraw_in_place(self):
+        file = Terminal()
+        progress = self.progress(1, interval=0, file=file)
+        progress.update({ 'Running': 1, 'Unknown': 1 })
+        progress.close({ 'Finished': 1 })
+        first, second = file.getvalue().split('\r')[1:]
+        self.assertIn('Unknown 1', first)
+        self.assertEqual(len(second), len(first) + 1)
+        self.assertTrue(second.endswith('\n'))
+
+if __name__ == '__main__':
+    unittest.main()
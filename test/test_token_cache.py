@@ -0,0 +1,64 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+from hpc_acm_cli.aad import TokenCache
+
+class FakeTokenEndpoint:
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.count = 0
+
+    def acquire(self):
+        self.count += 1
+        return {
+            'accessToken': 'token%d' % self.count,
+            'expiresIn': self.expires_in,
+        }
+
+class TokenCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tokens')
+        self.endpoint = FakeTokenEndpoint()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def get(self, client_id='client'):
+        cache = TokenCache(self.path, clock=lambda: self.now)
+        return cache.get('https://issuer', client_id, self.endpoint.acquire)
+
+    def test_reuse_across_instances(self):
+        self.assertEqual(self.get(), 'token1')
+        self.now += 600
+        self.assertEqual(self.get(), 'token1')
+        self.assertEqual(self.endpoint.count, 1)
+
+    def test_refresh_before_expiry(self):
+        self.get()
+        self.now += 3600 - TokenCache.refresh_margin + 1
+        self.assertEqual(self.get(), 'token2')
+
+    def test_keyed_by_client_id(self):
+        self.assertEqual(self.get('a'), 'token1')
+        self.assertEqual(self.get('b'), 'token2')
+        self.assertEqual(self.get('a'), 'token1')
+
+    @unittest.skipUnless(os.name == 'posix', 'file modes are POSIX only')
+    def test_file_mode(self):
+        self.get()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        # A file others can read is not trusted
+        os.chmod(self.path, 0o644)
+        self.assertEqual(self.get(), 'token2')
+
+    def test_expires_on(self):
+        cache = TokenCache(self.path)
+        self.assertEqual(cache.expires_at({'expiresOn': '2018-10-18 10:30:00.123456'}),
+                         cache.expires_at({'expiresOn': '2018-10-18 10:30:00'}))
+
+if __name__ == '__main__':
+    unittest.main()
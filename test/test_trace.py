@@ -0,0 +1,166 @@
+import io
+import os
+import sys
+import json
+import tempfile
+import unittest
+import threading
+from hpc_acm_cli import trace
+from hpc_acm_cli.trace import Tracer, percentile, instrument, tracing, span, bind
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100
+
+    def time(self):
+        return self.now
+
+class FakeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+        self.retries = None
+
+class RESTResponse:
+    def __init__(self, resp):
+        self.urllib3_response = resp
+        self.status = resp.status
+
+class ApiClient:
+    def request(self, method, url, _preload_content=True):
+        return RESTResponse(FakeResponse(200, b'{"id": 1}'))
+
+class DefaultApi:
+    def __init__(self):
+        self.api_client = ApiClient()
+
+    def get_node(self, id):
+        return self.api_client.request('GET', '/nodes/%s' % id)
+
+    def get_node_with_http_info(self, id):
+        return None
+
+class PercentileTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(percentile([], 50), 0)
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([1, 2], 0), 1)
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracer = Tracer(clock=self.clock.time)
+
+    def test_span(self):
+        with self.tracer.span('api', 'get_node', id=1) as args:
+            self.clock.now += 2
+            args['status'] = 200
+        self.assertEqual(len(self.tracer.spans), 1)
+        category, name, _, start, end, args = self.tracer.spans[0]
+        self.assertEqual((category, name, start, end), ('api', 'get_node', 100, 102))
+        self.assertEqual(args, { 'id': 1, 'status': 200 })
+
+    def test_span_of_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span('phase', 'print'):
+                raise ValueError()
+        self.assertEqual(self.tracer.spans[0][5], { 'error': 'ValueError' })
+
+    def test_save(self):
+        with self.tracer.span('phase', 'print'):
+            self.clock.now += 0.5
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.tracer.save(path)
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+        finally:
+            os.remove(path)
+        self.assertEqual([e['ph'] for e in events], ['M', 'X'])
+        self.assertEqual(events[1]['name'], 'print')
+        self.assertEqual(events[1]['ts'], 0)
+        self.assertEqual(events[1]['dur'], 500000)
+
+    def test_print_stats(self):
+        for i in range(3):
+            with self.tracer.span('api', 'get_node') as args:
+                self.clock.now += 1
+                args['bytes'] = 10
+        with self.tracer.span('phase', 'print'):
+            self.clock.now += 1
+        out = io.StringIO()
+        self.tracer.print_stats(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1].split(), ['print', '1', '1.000'])
+        self.assertEqual(lines[4].split(), ['get_node', '3', '0', '0', '30', '1000.0', '1000.0', '1000.0', '3.000'])
+        self.assertEqual(lines[-1], 'Total wall time: 4.000s')
+
+class InstrumentTest(unittest.TestCase):
+    def test_not_traced(self):
+        api = instrument(DefaultApi())
+        self.assertEqual(api.get_node.__name__, 'get_node')
+        with span('phase', 'print') as args:
+            api.get_node(1)
+        self.assertEqual(args, {})
+
+    def test_traced(self):
+        api = instrument(DefaultApi())
+        with tracing(path=os.devnull):
+            current = trace.current()
+            with span('phase', 'list'):
+                api.get_node(1)
+        self.assertIsNone(trace.current())
+        self.assertEqual([s[:2] for s in current.spans], [('api', 'get_node'), ('phase', 'list')])
+        self.assertEqual(current.spans[0][5], { 'status': 200, 'bytes': 9, 'retries': 0 })
+
+    def test_bind(self):
+        api = instrument(DefaultApi())
+        with tracing(path=os.devnull):
+            current = trace.current()
+            thread = threading.Thread(target=bind(api.get_node), args=(1,))
+            thread.start()
+            thread.join()
+        self.assertEqual([s[:2] for s in current.spans], [('api', 'get_node')])
+        self.assertNotEqual(current.spans[0][2], threading.current_thread().ident)
+
+    # Commands run in threads of "clus daemon" at the same time, each traced on its own
+    def test_concurrent(self):
+        api = instrument(DefaultApi())
+        both_traced = threading.Barrier(2)
+        tracers = {}
+        errors = []
+
+        def command(name):
+            try:
+                with tracing(stats=True, path=os.devnull):
+                    tracers[name] = trace.current()
+                    both_traced.wait(5)
+                    with span('phase', name):
+                        api.get_node(1)
+                    both_traced.wait(5)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=command, args=(name,)) for name in ('list', 'show')]
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(errors, [])
+        for name in ('list', 'show'):
+            self.assertEqual([s[:2] for s in tracers[name].spans], [('api', 'get_node'), ('phase', name)])
+
+if __name__ == '__main__':
+    unittest.main()
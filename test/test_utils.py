@@ -0,0 +1,201 @@
+import io
+import json
+import time
+import datetime
+import threading
+import unittest
+from contextlib import redirect_stdout
+from hpc_acm_cli.utils import iter_pages, parse_time, to_time, get_field, print_table, print_records, field_title, field_value
+
+try:
+    from terminaltables import AsciiTable
+except ImportError:
+    AsciiTable = None
+
+class Element:
+    def __init__(self, id):
+        self.id = id
+
+class FakeApi:
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+        self.threads = set()
+
+    # Elements of ids 1 to total, "count" of them after last_id
+    def get_page(self, count, last_id=None):
+        self.calls.append((count, last_id))
+        self.threads.add(threading.current_thread())
+        start = last_id or 0
+        return [Element(i) for i in range(start + 1, min(start + count, self.total) + 1)]
+
+class IterPagesTest(unittest.TestCase):
+    def ids(self, elements):
+        return [e.id for e in elements]
+
+    def test_all(self):
+        api = FakeApi(7)
+        self.assertEqual(self.ids(iter_pages(api.get_page, 3)), list(range(1, 8)))
+        self.assertEqual(api.calls, [(3, None), (3, 3), (3, 6), (3, 7)])
+
+    def test_last_id(self):
+        api = FakeApi(7)
+        self.assertEqual(self.ids(iter_pages(api.get_page, 3, last_id=5)), [6, 7])
+
+    def test_limit(self):
+        api = FakeApi(100)
+        self.assertEqual(self.ids(iter_pages(api.get_page, 3, limit=7)), list(range(1, 8)))
+        self.assertEqual(api.calls, [(3, None), (3, 3), (1, 6)])
+
+    def test_zero_limit(self):
+        api = FakeApi(100)
+        self.assertEqual(list(iter_pages(api.get_page, 3, limit=0)), [])
+        self.assertEqual(api.calls, [])
+
+    def test_prefetch(self):
+        api = FakeApi(7)
+        pages = iter_pages(api.get_page, 3, prefetch=True)
+        self.assertEqual(next(pages).id, 1)
+        self.assertEqual(self.ids(pages), list(range(2, 8)))
+        self.assertEqual(api.calls, [(3, None), (3, 3), (3, 6), (3, 7)])
+        self.assertEqual(len(api.threads), 2)
+
+    def test_prefetch_with_limit(self):
+        api = FakeApi(100)
+        self.assertEqual(self.ids(iter_pages(api.get_page, 3, limit=6, prefetch=True)), list(range(1, 7)))
+        self.assertEqual(api.calls, [(3, None), (3, 3)])
+
+class FieldTest(unittest.TestCase):
+    def test_parse_time_ago(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.assertAlmostEqual((now - parse_time('12h')).total_seconds(), 12 * 3600, delta=5)
+        self.assertAlmostEqual((now - parse_time('1.5d')).total_seconds(), 36 * 3600, delta=5)
+
+    def test_parse_time(self):
+        self.assertEqual(parse_time('2018-10-18T10:30:00Z'), datetime.datetime(2018, 10, 18, 10, 30, tzinfo=datetime.timezone.utc))
+        self.assertIsNotNone(parse_time('2018-10-18').tzinfo)
+        # In local time
+        self.assertEqual(parse_time('2018-10-18 10:30').timestamp(), time.mktime((2018, 10, 18, 10, 30, 0, 0, 0, -1)))
+        with self.assertRaises(ValueError):
+            parse_time('yesterday-ish')
+
+    def test_to_time(self):
+        expected = datetime.datetime(2018, 10, 18, 10, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(to_time('2018-10-18T10:30:00Z'), expected)
+        self.assertEqual(to_time(expected), expected)
+
+    def test_get_field(self):
+        self.assertEqual(get_field({ 'targetNodes': ['a'] }, 'target_nodes'), ['a'])
+        self.assertEqual(get_field(Element(3), 'id'), 3)
+
+class PrintTableTest(unittest.TestCase):
+    fields = ['id', { 'title': 'Nodes', 'value': lambda e: e['nodes'] }, 'state']
+
+    def jobs(self, count):
+        return [{ 'id': i, 'nodes': '%d\nnode%d' % (i, i), 'state': 'Finished' } for i in range(count)]
+
+    def print_table(self, fields, collection, **kwargs):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            print_table(fields, collection, **kwargs)
+        return out.getvalue()
+
+    def ascii_table(self, fields, collection):
+        rows = [[field_value(e, f) for f in fields] for e in collection]
+        return AsciiTable([[field_title(f) for f in fields]] + rows).table + '\n'
+
+    @unittest.skipIf(AsciiTable is None, 'terminaltables is not installed')
+    def test_as_ascii_table(self):
+        jobs = self.jobs(12)
+        self.assertEqual(self.print_table(self.fields, iter(jobs)), self.ascii_table(self.fields, jobs))
+
+    @unittest.skipIf(AsciiTable is None, 'terminaltables is not installed')
+    def test_empty(self):
+        self.assertEqual(self.print_table(self.fields, iter([])), self.ascii_table(self.fields, []))
+
+    def test_fixed_width(self):
+        fields = ['id', { 'title': 'Command', 'value': lambda e: e['command'], 'width': 12 }]
+        out = self.print_table(fields, [{ 'id': 1, 'command': 'echo hello world' }, { 'id': 22, 'command': 'ls' }])
+        self.assertEqual(out.splitlines(), [
+            '+----+--------------+',
+            '| Id | Command      |',
+            '+----+--------------+',
+            '| 1  | echo hel ... |',
+            '| 22 | ls           |',
+            '+----+--------------+',
+        ])
+
+    def test_wider_after_sample(self):
+        jobs = self.jobs(3)
+        jobs[2]['state'] = 'Canceled by user'
+        lines = self.print_table(self.fields, iter(jobs), sample_size=2).splitlines()
+        # Borders so far are as wide as the sampled rows, and the column grows for the
+        # row after them.
+        self.assertEqual(lines[0], '+----+-------+----------+')
+        self.assertEqual(lines[-3], '| 2  | 2     | Canceled by user |')
+        self.assertEqual(lines[-2], '|    | node2 |                  |')
+        self.assertEqual(lines[-1], '+----+-------+------------------+')
+
+class PrintRecordsTest(unittest.TestCase):
+    fields = ['id', { 'title': 'Command', 'value': lambda e: e['command'] }]
+    jobs = [
+        { 'id': 1, 'command': 'echo "a, b"' },
+        { 'id': 2, 'command': 'echo a\tb\necho c' },
+    ]
+
+    def print_records(self, format, collection=None, serialize=None):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            print_records(self.fields, iter(self.jobs if collection is None else collection), format, serialize)
+        return out.getvalue()
+
+    def test_csv(self):
+        self.assertEqual(self.print_records('csv').split('\n'), [
+            'Id,Command',
+            '1,"echo ""a, b"""',
+            '2,"echo a\tb',
+            'echo c"',
+            '',
+        ])
+
+    def test_tsv(self):
+        self.assertEqual(self.print_records('tsv').split('\n'), [
+            'Id\tCommand',
+            '1\t"echo ""a, b"""',
+            '2\t"echo a\tb',
+            'echo c"',
+            '',
+        ])
+
+    def test_empty(self):
+        self.assertEqual(self.print_records('csv', []), 'Id,Command\n')
+        self.assertEqual(self.print_records('jsonl', []), '')
+
+    def test_jsonl(self):
+        lines = self.print_records('jsonl').splitlines()
+        self.assertEqual([json.loads(l) for l in lines], [
+            { 'id': 1, 'Command': 'echo "a, b"' },
+            { 'id': 2, 'Command': 'echo a\tb\necho c' },
+        ])
+        self.assertTrue(lines[0].startswith('{"id": 1, '))
+
+    def test_jsonl_serialized(self):
+        # Objects by serialize for models, and those of the fields for other elements,
+        # with values not of JSON types as strings
+        jobs = [
+            { 'id': 1, 'command': datetime.datetime(2018, 10, 18, 10, 30) },
+            { 'id': 2, 'command': 'ls', 'model': True },
+        ]
+        serialize = lambda e: { 'id': e['id'], 'commandLine': e['command'] } if 'model' in e else None
+        lines = self.print_records('jsonl', jobs, serialize).splitlines()
+        self.assertEqual([json.loads(l) for l in lines], [
+            { 'id': 1, 'Command': '2018-10-18 10:30:00' },
+            { 'id': 2, 'commandLine': 'ls' },
+        ])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.print_records('xml')
+
+if __name__ == '__main__':
+    unittest.main()